@@ -3,47 +3,99 @@
 # According to the OpenAlex link above, the 15 top countries in terms of number of publication 
 # are listed on utils/mappings.py as COUNTRY_CODES
 
-import requests
 import csv
-from time import sleep
+import time
 from utils import mappings
+from utils.harvest_metrics import HarvestMetrics
+from utils.http_cache import CacheMissError, ResponseCache
+from utils.openalex import OpenAlexClient
 
 OUTPUT_FILE = "../../data/processed/1_publication_summary_of_countries.csv"
 
 BEGIN_YEAR = "2015"
 END_YEAR = "2024"
 
-
-def get_count(url):
-    """Makes a GET request to the given URL and returns the count from the response metadata."""
+# Request budget shared by all in-flight requests
+REQUESTS_PER_SECOND = 10
+MAX_IN_FLIGHT = 8
+
+# Count queries are cached on disk so reruns do not repeat them. Set OFFLINE to True
+# to rerun from the cache only, without network access.
+CACHE_FILE = "../../data/cache/openalex_responses.sqlite"
+CACHE_TTL_DAYS = 30
+CACHE_MAX_ENTRIES = 100_000
+OFFLINE = False
+
+# Request metrics are written as JSON per run; set PROMETHEUS_PORT to also serve
+# them at http://127.0.0.1:<port>/metrics while the run is going
+METRICS_PATH = "../../logs/metrics"
+PROMETHEUS_PORT = None
+
+
+def build_params(country):
+    """Builds the OpenAlex query parameters for the publication summary of a country."""
+    return {
+        "filter": (
+            f"primary_topic.field.id:fields/17,publication_year:{BEGIN_YEAR}-{END_YEAR},"
+            f"type:types/article|types/book-chapter,authorships.countries:{country}"
+        ),
+        "cited_by_count_sum": "true",
+        "per_page": 1,
+    }
+
+
+def get_count(data):
+    """
+    Returns the publication and citation counts from the metadata of an API response.
+    A query missing from the cache in OFFLINE mode aborts the run instead of being
+    counted as 0.
+    """
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
+        if isinstance(data, Exception):
+            raise data
 
         total_publications = data.get("meta", {}).get("count", 0)
         citations_count = data.get("meta", {}).get("cited_by_count_sum", 0)
 
         return total_publications, citations_count
+    except CacheMissError:
+        raise
     except Exception as e:
-        print(f"Error fetching data from {url}: {e}")
+        print(f"Error fetching data: {e}")
         return 0, 0
 
 
 def main():
     results = []
-
-    for country in mappings.COUNTRY_CODES.keys():
-        print(f"Getting publication summary for {mappings.COUNTRY_CODES[country]}")
-
-        # Build the API endpoint using the country code
-        works_url = (
-            f"https://api.openalex.org/works?page=1&"
-            f"filter=primary_topic.field.id:fields/17,publication_year:{BEGIN_YEAR}+-+{END_YEAR},type:types/article|types/book-chapter,"
-            f"authorships.countries:{country}&cited_by_count_sum=true&per_page=1"
-        )
-
-        total_publications, citations_count = get_count(works_url)
+    countries = list(mappings.COUNTRY_CODES.keys())
+
+    # Fetch the summaries of all countries concurrently under the request budget
+    metrics = HarvestMetrics("1_publication_summary", unit="queries")
+    if PROMETHEUS_PORT:
+        metrics.serve_prometheus(PROMETHEUS_PORT)
+    cache = ResponseCache(
+        CACHE_FILE, ttl_seconds=CACHE_TTL_DAYS * 86400, max_entries=CACHE_MAX_ENTRIES
+    )
+    client = OpenAlexClient(
+        requests_per_second=REQUESTS_PER_SECOND,
+        max_in_flight=MAX_IN_FLIGHT,
+        cache=cache,
+        offline=OFFLINE,
+        metrics=metrics,
+    )
+    print(f"Getting publication summary for {len(countries)} countries")
+    metrics.add_expected(len(countries))
+    responses = client.get_many([build_params(country) for country in countries])
+    metrics.add_done(len(countries))
+    client.close()
+
+    metrics_file = f"{METRICS_PATH}/1_{time.strftime('%Y%m%dT%H%M%S')}.json"
+    metrics.write_json(metrics_file)
+    metrics.close()
+    print(f"Request metrics written to {metrics_file}")
+
+    for country, data in zip(countries, responses):
+        total_publications, citations_count = get_count(data)
 
         results.append(
             {
@@ -59,8 +111,6 @@ def main():
             }
         )
 
-        sleep(1)
-
     # Sort the results by total publications (descending order)
     results.sort(key=lambda x: x["total_publications"], reverse=True)
 
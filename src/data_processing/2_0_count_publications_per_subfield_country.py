@@ -1,14 +1,44 @@
-import requests
+import argparse
 import pandas as pd
 import json
 import logging
 import time
-from typing import Dict
-
-COUNTRY_CODE = "IN"  
+from utils import mappings
+from utils.harvest_metrics import HarvestMetrics
+from utils.http_cache import ResponseCache
+from utils.openalex import OpenAlexClient
+from utils.query_planner import execute_count_queries, plan_count_queries
+
+# Countries harvested when none are given on the command line
+COUNTRY_CODES = list(mappings.COUNTRY_CODES.keys())
 EMAIL_FILE_PATH = "../../config/email.json"
 SUBFIELDS_FILE_PATH = "../../data/external/openalex_unique_subfields.csv"
 OUTPUT_PATH = "../../data/raw/publication_counts"
+OUTPUT_FILE = f"{OUTPUT_PATH}/combined_publication_counts.csv"
+
+# Request budget shared by all in-flight requests
+REQUESTS_PER_SECOND = 10
+MAX_IN_FLIGHT = 8
+
+# Count queries are cached on disk so reruns do not repeat them. Set OFFLINE to True
+# to rerun from the cache only, without network access.
+CACHE_FILE = "../../data/cache/openalex_responses.sqlite"
+CACHE_TTL_DAYS = 30
+CACHE_MAX_ENTRIES = 100_000
+OFFLINE = False
+
+# Request metrics are written as JSON per run; set PROMETHEUS_PORT to also serve
+# them at http://127.0.0.1:<port>/metrics while the run is going
+METRICS_PATH = "../../logs/metrics"
+PROMETHEUS_PORT = None
+
+BASE_FILTER = "type:types/article|types/book-chapter,primary_topic.field.id:17"
+
+# Counts come from group_by requests over the largest of the country, year and subfield
+# dimensions. citation_count is not available through group_by and needs one request
+# per (country, year, subfield); drop it from METRICS when only publication counts
+# are needed.
+METRICS = ["count", "citation_count"]
 
 PUBLICATION_YEAR = [
     "2024",
@@ -63,26 +93,29 @@ def setup_logging(log_file: str = "../../logs/open_alex_publications.log") -> No
     console_handler.setFormatter(console_formatter)
     logger.addHandler(console_handler)
 
-def fetch_publication_count(params: Dict, logger: logging.Logger) -> int:
-    """
-    Sends a query to the OpenAlex API with minimal data (per_page=1) and returns the total count
-    of works from the meta section of the response.
-    """
-    url = "https://api.openalex.org/works"
-    response = requests.get(url, params=params)
-    response.raise_for_status()
-    data = response.json()
-    count = data.get("meta", {}).get("count", 0)
-    citation_count = data.get("meta", {}).get("cited_by_count_sum", 0)
-    return count, citation_count
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Count publications per subfield, year and country on OpenAlex."
+    )
+    parser.add_argument(
+        "--countries",
+        nargs="+",
+        default=COUNTRY_CODES,
+        help="ISO country codes to count (default: every country in mappings.COUNTRY_CODES)",
+    )
+    return parser.parse_args()
 
 def main():
     """
-    Main function to fetch publication counts per subfield and year for a specific country,
-    and save the results to a CSV.
+    Main function to fetch publication counts per subfield and year for a list of countries,
+    and save the combined results to a CSV.
     """
+    args = parse_args()
     setup_logging()
     logger = logging.getLogger(__name__)
+    metrics = HarvestMetrics("2_0_subfield_counts", unit="queries")
+    if PROMETHEUS_PORT:
+        metrics.serve_prometheus(PROMETHEUS_PORT)
 
     try:
         email = read_email_from_json()
@@ -94,55 +127,62 @@ def main():
             logger.error("No subfields loaded from unique_subfields.csv. Exiting.")
             return
 
-        results_list = []
-
-        # Iterate over each publication year and each subfield.
-        for year in PUBLICATION_YEAR:
-
-            for _, row in subfields_df.iterrows():
-                subfield_id = row["subfield_id"]
-                subfield_display_name = row["subfield_display_name"]
-
-                # Build filter query string.
-                # Adjust the filter as needed. Here, we assume primary_topic.field.id is 17.
-                filter_query = (
-                    f"type:types/article|types/book-chapter,"
-                    f"institutions.country_code:{COUNTRY_CODE},"
-                    f"primary_topic.field.id:17,"
-                    f"primary_topic.subfield.id:{subfield_id},"
-                    f"publication_year:{year}"
-                )
-                params = {
-                    "select": "id",  # Only need the id field
-                    "filter": filter_query,
-                    "per_page": 1,  # Minimal result; we use the meta for the count,
-                    "cited_by_count_sum": "true",  # Include citation count
-                    "mailto": email,
-                }
-                try:
-                    count, citation_count = fetch_publication_count(params, logger)
-                    logger.info(f"Year {year}, {subfield_id} ({subfield_display_name}): count = {count}, citation_count = {citation_count}")
-                    results_list.append({
-                        "publication_year": year,
-                        "subfield_id": subfield_id,
-                        "subfield_display_name": subfield_display_name,
-                        "count": count,
-                        "citation_count": citation_count,
-                    })
-                    time.sleep(2.5)  # Delay between requests to be respectful
-                except Exception as e:
-                    logger.error(f"Error fetching count for year {year}, subfield {subfield_id}: {e}")
+        cache = ResponseCache(
+            CACHE_FILE, ttl_seconds=CACHE_TTL_DAYS * 86400, max_entries=CACHE_MAX_ENTRIES
+        )
+        client = OpenAlexClient(
+            email=email,
+            requests_per_second=REQUESTS_PER_SECOND,
+            max_in_flight=MAX_IN_FLIGHT,
+            cache=cache,
+            offline=OFFLINE,
+            metrics=metrics,
+            logger=logger,
+        )
+
+        # Plan the fewest requests covering every (country, year, subfield) cell.
+        # All of them share the client's request budget.
+        # Adjust the filter as needed. Here, we assume primary_topic.field.id is 17.
+        cube = {
+            "country_code": args.countries,
+            "publication_year": PUBLICATION_YEAR,
+            "subfield_id": subfields_df["subfield_id"].tolist(),
+        }
+        queries = plan_count_queries(BASE_FILTER, cube, METRICS)
+        logger.info(f"Fetching {len(queries)} queries for {len(args.countries)} countries")
+
+        metrics.add_expected(len(queries))
+        results_list = execute_count_queries(queries, cube, METRICS, client, logger)
+        metrics.add_done(len(queries))
+        client.close()
 
         # Create DataFrame from results and save to CSV.
         results_df = pd.DataFrame(results_list)
-        results_df["country_code"] = COUNTRY_CODE
-        output_csv = f"{OUTPUT_PATH}/subfield_publication_counts_{COUNTRY_CODE}.csv"
-        results_df.to_csv(output_csv, index=False)
-        logger.info(f"Saved publication counts to {output_csv}")
+        results_df = results_df.merge(subfields_df, on="subfield_id", how="left")
+        results_df = results_df[
+            ["publication_year", "subfield_id", "subfield_display_name", *METRICS, "country_code"]
+        ]
+
+        # Keep the row order of the per-country files: country, then year, then subfield
+        sort_keys = {
+            "country_code": {c: i for i, c in enumerate(args.countries)},
+            "publication_year": {y: i for i, y in enumerate(PUBLICATION_YEAR)},
+            "subfield_id": {s: i for i, s in enumerate(cube["subfield_id"])},
+        }
+        results_df = results_df.sort_values(
+            list(sort_keys), key=lambda column: column.map(sort_keys[column.name])
+        )
+        results_df.to_csv(OUTPUT_FILE, index=False)
+        logger.info(f"Saved publication counts to {OUTPUT_FILE}")
 
     except Exception as e:
         logger.error(f"Script failed: {e}")
         raise
+    finally:
+        metrics_file = f"{METRICS_PATH}/2_0_{time.strftime('%Y%m%dT%H%M%S')}.json"
+        metrics.write_json(metrics_file)
+        metrics.close()
+        logger.info(f"Request metrics written to {metrics_file}")
 
 if __name__ == "__main__":
     main()
@@ -1,20 +1,22 @@
-import pandas as pd
+# 2_0 writes combined_publication_counts.csv directly; this script only combines
+# per-country files left by earlier runs.
+from utils.consolidate import StreamingCsvWriter, iter_unique_chunks
 
 FILES_PATH = "../../data/raw/publication_counts/subfield_publication_counts"
 COUNTRIES = ["BR", "CN", "US", "IN"]
 OUTPUT_FILE = "../../data/raw/publication_counts/combined_publication_counts.csv"
+# A count cell is identified by its country, year and subfield
+KEY = ["country_code", "publication_year", "subfield_id"]
 
 def main():
-    # Load and store each country's DataFrame in a list
-    dfs = [pd.read_csv(f"{FILES_PATH}_{country}.csv") for country in COUNTRIES]
+    # Stream each country's file into the combined file, dropping repeated cells
+    files = [f"{FILES_PATH}_{country}.csv" for country in COUNTRIES]
+    skipped = []
+    with StreamingCsvWriter(OUTPUT_FILE) as writer:
+        for chunk in iter_unique_chunks(files, KEY, skipped=skipped):
+            writer.write(chunk)
 
-    # Concatenate all DataFrames into a single DataFrame
-    combined_df = pd.concat(dfs, ignore_index=True)
-
-    # Save the combined DataFrame to a new CSV file
-    combined_df.to_csv(OUTPUT_FILE, index=False)
-
-    print(f"Combined dataset saved to {OUTPUT_FILE}")
+    print(f"Combined dataset saved to {OUTPUT_FILE} ({sum(skipped)} duplicate rows dropped)")
 
 if __name__ == "__main__":
     main()
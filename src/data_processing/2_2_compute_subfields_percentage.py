@@ -1,10 +1,13 @@
 import pandas as pd
+from utils.count_cube import CountCube
 
 
 PUBLICATION_COUNTS_FILE_PATH = (
     "../../data/raw/publication_counts/combined_publication_counts.csv"
 )
 OUTPUT_FILE = "../../data/processed/2_subfield_percentages.csv"
+# Every (country, year, subfield) cell with world shares, activity index and citations per paper
+INDICATORS_FILE = "../../data/processed/2_subfield_indicators.csv"
 
 
 def generate_subfield_percentages(df):
@@ -29,14 +32,10 @@ def generate_subfield_percentages(df):
     # Ensure publication_year is integer
     df["publication_year"] = df["publication_year"].astype(int)
 
-    # Compute the total publications per country per year
-    total_per_year = (
-        df.groupby(["country_code", "publication_year"])["count"]
-        .sum()
-        .reset_index(name="total")
-    )
-    # Merge the totals back into the original DataFrame
-    df = df.merge(total_per_year, on=["country_code", "publication_year"])
+    # Gather each row's country-year total from the count cube
+    cube = CountCube(df)
+    country, year, _ = cube.cell_index(df)
+    df["total"] = cube.country_year_total[country, year, 0]
 
     # Calculate percentage for each row
     df["percentage"] = (df["count"] / df["total"]) * 100
@@ -52,6 +51,9 @@ def main():
     # Save the DataFrame to CSV
     subfilds_percent.to_csv(OUTPUT_FILE, index=False)
 
+    # All indicators of every cell, from one cube
+    CountCube(publication_counts).to_frame().to_csv(INDICATORS_FILE, index=False)
+
 
 if __name__ == "__main__":
     main()
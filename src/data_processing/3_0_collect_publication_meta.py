@@ -1,13 +1,60 @@
-import requests
+import argparse
+import csv
 import pandas as pd
 import json
 import logging
+import os
+import shutil
 import time
-from typing import Dict, List
-
-COUNTRY_CODE = "BR" 
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+from utils import mappings
+from utils.checkpoint import SliceCheckpoint, write_json_atomic, write_manifest
+from utils.dedup import WorkRegistry
+from utils.harvest_metrics import HarvestMetrics
+from utils.openalex import MAX_PER_PAGE, OpenAlexClient
+from utils.snapshot import ingest_partitions, list_partitions
+from utils.works import WORK_COLUMNS, process_openalex_id, process_work
+
+# Countries harvested when none are given on the command line
+COUNTRY_CODES = list(mappings.COUNTRY_CODES.keys())
 EMAIL_FILE_PATH = "../../config/email.json"
 RESULTS_PATH = "../../data/raw/publication_meta"
+COMBINED_FILE = f"{RESULTS_PATH}/publication_meta.csv"
+# Work id -> (country, year) slice membership, written in dedup mode
+COMBINED_MEMBERSHIP_FILE = f"{RESULTS_PATH}/work_slices.csv"
+CHECKPOINT_PATH = f"{RESULTS_PATH}/checkpoints"
+MANIFEST_FILE = f"{RESULTS_PATH}/manifest.json"
+# Start time of the last successful harvest or refresh, used by --refresh
+HARVEST_STATE_FILE = f"{RESULTS_PATH}/harvest_state.json"
+
+# Request budget shared by all in-flight requests
+REQUESTS_PER_SECOND = 10
+MAX_IN_FLIGHT = 8
+# (country, year) slices harvested at the same time, all sharing the request budget
+MAX_CONCURRENT_SLICES = 8
+
+# Request metrics are written as JSON per run; set PROMETHEUS_PORT to also serve
+# them at http://127.0.0.1:<port>/metrics while the run is going
+METRICS_PATH = "../../logs/metrics"
+PROMETHEUS_PORT = None
+
+# "cursor" streams pages of up to 200 works with constant memory and no 10k result cap,
+# and can resume a failed year from its last committed page;
+# "page" fetches pages concurrently but holds the whole year in memory
+PAGING_MODE = "cursor"
+
+# In dedup mode each slice first pages through the ids its query returns, then fetches
+# full records only for works no other slice has stored yet (requires cursor paging)
+DEDUPLICATE = False
+# Largest number of values OpenAlex accepts in one OR filter
+IDS_PER_REQUEST = 100
+
+# Worker processes decompressing and filtering snapshot partitions (None: one per CPU)
+SNAPSHOT_WORKERS = None
+
+WORK_FIELDS = "id,doi,title,authorships,publication_year,primary_topic,cited_by_count,counts_by_year"
 
 PUBLICATION_YEAR = [
     # "2024",
@@ -40,6 +87,31 @@ def read_email_from_json(file_path: str) -> str:
         raise ValueError(f"Invalid JSON in {file_path}")
 
 
+def read_api_key_from_json(file_path: str) -> Optional[str]:
+    """
+    Reads the optional OpenAlex API key from the same JSON file as the email.
+    Filtering on from_updated_date (used by --refresh) requires one.
+    """
+    with open(file_path, "r") as f:
+        return json.load(f).get("api_key")
+
+
+def read_last_harvest() -> Optional[str]:
+    """Returns the start time of the last successful harvest, if any."""
+    if not os.path.exists(HARVEST_STATE_FILE):
+        return None
+    with open(HARVEST_STATE_FILE, "r") as f:
+        return json.load(f).get("last_harvest")
+
+
+def write_last_harvest(started_at: str, dedup: bool) -> None:
+    """
+    Records the start time of a successful harvest and whether it ran in dedup mode,
+    which tells 3_1 which combined files belong to it.
+    """
+    write_json_atomic(HARVEST_STATE_FILE, {"last_harvest": started_at, "dedup": dedup})
+
+
 def setup_logging(log_file: str = "open_alex_publications.log") -> None:
     """
     Configures logging to both a file and the console.
@@ -64,38 +136,16 @@ def setup_logging(log_file: str = "open_alex_publications.log") -> None:
     logger.addHandler(console_handler)
 
 
-def process_doi(doi: str) -> str:
-    """
-    Removes the 'https://doi.org/' prefix from a DOI string.
-    """
-    if doi and doi.startswith("https://doi.org/"):
-        return doi.replace("https://doi.org/", "")
-    return doi
-
-
-def process_openalex_id(openalex_id: str) -> str:
-    """
-    Removes the 'https://openalex.org/' prefix from an OpenAlex ID string.
-    """
-    if openalex_id and openalex_id.startswith("https://openalex.org/"):
-        return openalex_id.replace("https://openalex.org/", "")
-    return openalex_id
-
-
-def fetch_all_works(params: Dict, logger: logging.Logger) -> List[Dict]:
+def fetch_all_works(params: Dict, client: OpenAlexClient, logger: logging.Logger) -> List[Dict]:
     """
     Fetches all works from OpenAlex API using pagination.
+    The first page gives the total count; the remaining pages are fetched concurrently.
     """
     all_works = []
-    url = "https://api.openalex.org/works"
 
     # Fetch first page
     logger.info("Fetching first page...")
-    params["page"] = 1
-    full_url = f"{url}?{'&'.join([f'{k}={v}' for k, v in params.items()])}"
-    response = requests.get(full_url)
-    response.raise_for_status()
-    data = response.json()
+    data = client.get({**params, "page": 1})
     all_works.extend(data.get("results", []))
 
     total_count = data["meta"]["count"]
@@ -105,140 +155,513 @@ def fetch_all_works(params: Dict, logger: logging.Logger) -> List[Dict]:
     logger.info(f"Total pages to fetch: {total_pages}")
 
     # Fetch remaining pages
-    for page in range(2, total_pages + 1):
-        logger.info(f"Fetching page {page}/{total_pages}...")
-        params["page"] = page
-        try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            page_data = response.json()
-            all_works.extend(page_data.get("results", []))
-            time.sleep(3)  # Respectful delay between requests
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Failed to fetch page {page}: {e}")
-            raise
+    logger.info(f"Fetching pages 2-{total_pages}...")
+    pages = range(2, total_pages + 1)
+    responses = client.get_many([{**params, "page": page} for page in pages])
+    for page, page_data in zip(pages, responses):
+        if isinstance(page_data, Exception):
+            logger.error(f"Failed to fetch page {page}: {page_data}")
+            raise page_data
+        all_works.extend(page_data.get("results", []))
 
     logger.info(f"Successfully retrieved {len(all_works)} works.")
     return all_works
 
 
-def process_work(work: Dict) -> Dict:
-    """
-    Processes a single work to extract and flatten required fields,
-    while removing DOI and OpenAlex URL prefixes.
-    
-    For the counts_by_year field, instead of keeping the original years,
-    the citations are saved with keys representing the offset relative to the publication year.
-    For example, if a work was published in 2020:
-      - The number of citations in 2020 will be stored as "0_year"
-      - The number of citations in 2021 will be stored as "1_year", etc.
-    """
-    processed = {
-        "id": process_openalex_id(work.get("id")),
-        "doi": process_doi(work.get("doi")),
-        "title": work.get("title"),
-        "publication_year": work.get("publication_year"),
-        "authorships": [],
-        "subfield": {},
-        "cited_by_count": work.get("cited_by_count"),
-        "counts_by_year": ""  # will update below
-    }
+def iter_work_pages(
+    params: Dict, client: OpenAlexClient, logger: logging.Logger, cursor: str = "*"
+) -> Iterator[Tuple[List[Dict], Dict]]:
+    """
+    Yields (works, meta) pages from OpenAlex API using cursor pagination,
+    so only one page is held in memory at a time.
+    `meta["next_cursor"]` can be passed back as `cursor` to resume after that page.
+    """
+    params = {**params, "per_page": MAX_PER_PAGE}
+    total_count = None
+    fetched = 0
+    for data in client.iter_cursor_pages(params, cursor=cursor):
+        meta = data["meta"]
+        if total_count is None:
+            total_count = meta["count"]
+            logger.info(f"Total publications found: {total_count}")
+        works = data.get("results", [])
+        fetched += len(works)
+        eta = client.metrics.eta_seconds() if client.metrics is not None else None
+        eta_note = f" (run ETA {eta:.0f}s)" if eta is not None else ""
+        logger.info(f"Fetched {fetched}/{total_count} works{eta_note}...")
+        yield works, meta
+
+    logger.info(f"Successfully retrieved {fetched} works.")
+
+
+def fetch_works_by_id(work_ids: List[str], client: OpenAlexClient) -> List[Dict]:
+    """
+    Fetches the full records of the given works, IDS_PER_REQUEST ids per request,
+    with the requests running concurrently.
+    """
+    batches = [
+        work_ids[i : i + IDS_PER_REQUEST] for i in range(0, len(work_ids), IDS_PER_REQUEST)
+    ]
+    params_list = [
+        {"select": WORK_FIELDS, "filter": f"openalex:{'|'.join(batch)}", "per_page": IDS_PER_REQUEST}
+        for batch in batches
+    ]
+    works = []
+    for data in client.get_many(params_list):
+        if isinstance(data, Exception):
+            raise data
+        works.extend(data.get("results", []))
+    return works
+
+
+def slice_filter(country: str, year: str) -> str:
+    """Builds the OpenAlex filter selecting the works of one (country, year) slice."""
+    return "type:article,institutions.country_code:{},primary_topic.field.id:17,publication_year:{}".format(
+        country, year
+    )
+
+
+def harvest_slice(
+    country: str,
+    year: str,
+    client: OpenAlexClient,
+    logger: logging.Logger,
+    registry: Optional[WorkRegistry] = None,
+) -> None:
+    """
+    Fetches, processes and writes all works of one (country, year) slice.
 
-    # Process authorships
-    authorships = work.get("authorships", [])
-    for authorship in authorships:
-        author_info = authorship.get("author", {})
-        institutions = [
-            {
-                "id": process_openalex_id(inst.get("id")),
-                "display_name": inst.get("display_name"),
-            }
-            for inst in authorship.get("institutions", [])
-        ]
-        processed_author = {
-            "id": process_openalex_id(author_info.get("id")),
-            "name": author_info.get("display_name"),
-            "institutions": institutions,
-            "countries": authorship.get("countries", []),
-        }
-        processed["authorships"].append(processed_author)
+    Every page is appended to the slice CSV and then committed to the slice checkpoint,
+    so a rerun skips completed slices and resumes unfinished ones from their last
+    committed cursor.
 
-    # Process primary topic and subfield
-    primary_topic = work.get("primary_topic", {})
-    processed_topic = {
-        "id": process_openalex_id(primary_topic.get("id")),
-        "display_name": primary_topic.get("display_name"),
+    With a registry, the slice pages through work ids only, fetches and writes just the
+    works not already stored, and records every id in its membership file. A rerun
+    truncates the membership file back to its committed size like the CSV.
+    """
+    output_file = f"{RESULTS_PATH}/open_alex_publications_{country}_{year}.csv"
+    membership_file = None
+    if registry is not None:
+        membership_file = f"{RESULTS_PATH}/work_slices_{country}_{year}.csv"
+    checkpoint = SliceCheckpoint(CHECKPOINT_PATH, country, year, output_file, membership_file)
+    if checkpoint.complete:
+        logger.info(f"{country} {year} already harvested ({checkpoint.rows} works), skipping.")
+        return
+
+    logger.info(f"Starting data retrieval for {country} {year}...")
+
+    # Configure API parameters
+    params = {
+        "select": WORK_FIELDS,
+        "filter": slice_filter(country, year),
+        "per_page": 25,
     }
-    processed["primary_topic"] = processed_topic
 
-    subfield = primary_topic.get("subfield", {})
-    processed["subfield"] = {
-        "id": process_openalex_id(subfield.get("id")),
-        "display_name": subfield.get("display_name"),
-    }
+    # Fetch works, either streamed page by page or all at once
+    logger.info("Starting data retrieval from OpenAlex API...")
+    if registry is not None:
+        if checkpoint.members:
+            logger.info(f"Resuming {country} {year} after {checkpoint.members} committed ids...")
+        params["select"] = "id"
+        pages = iter_work_pages(params, client, logger, cursor=checkpoint.cursor)
+    elif PAGING_MODE == "cursor":
+        if checkpoint.rows:
+            logger.info(f"Resuming {country} {year} after {checkpoint.rows} committed works...")
+        pages = iter_work_pages(params, client, logger, cursor=checkpoint.cursor)
+    else:
+        checkpoint.state.update(rows=0)
+        all_works = fetch_all_works(params, client, logger)
+        pages = [(all_works, {"count": len(all_works), "next_cursor": None})]
+
+    # Process and append each page to the CSV as it arrives, then commit it
+    checkpoint.prepare_output()
+    metrics = client.metrics
+    committed = checkpoint.members if registry is not None else checkpoint.rows
+    for page, (works, meta) in enumerate(pages):
+        if metrics is not None:
+            # Progress counts the works the slice query returns, resumed ones excluded
+            if page == 0:
+                metrics.add_expected(meta["count"] - committed)
+            metrics.add_done(len(works))
+        members = 0
+        if registry is not None:
+            work_ids = [process_openalex_id(work["id"]) for work in works]
+            # Fetched before claiming and recording anything, so that a failed fetch
+            # leaves the ids to other slices and nothing uncommitted on disk
+            fetched = fetch_works_by_id(registry.unclaimed(work_ids), client)
+            claimed = set(registry.claim(process_openalex_id(work["id"]) for work in fetched))
+            # Another slice may have claimed some of the ids during the fetch
+            works = [work for work in fetched if process_openalex_id(work["id"]) in claimed]
+            with open(membership_file, "a", newline="") as f:
+                writer = csv.writer(f)
+                if checkpoint.members == 0:
+                    writer.writerow(["work_id", "country_code", "publication_year"])
+                writer.writerows((work_id, country, year) for work_id in work_ids)
+            members = len(work_ids)
+
+        if works:
+            df = pd.DataFrame([process_work(work) for work in works])
+            df.to_csv(output_file, mode="a", header=checkpoint.rows == 0, index=False)
+        checkpoint.commit(meta.get("next_cursor"), len(works), meta["count"], members)
+    checkpoint.mark_complete()
+
+    logger.info(f"Data saved to '{output_file}' with {checkpoint.rows} entries.")
+    if registry is not None:
+        logger.info(
+            f"{country} {year}: {checkpoint.members} works returned, "
+            f"{checkpoint.members - checkpoint.rows} already stored by other slices."
+        )
+
+
+def fetch_updated_slice(
+    country: str, year: str, since: str, client: OpenAlexClient, logger: logging.Logger
+) -> Tuple[Dict[str, Dict], int]:
+    """
+    Fetches the works of a slice updated on OpenAlex since `since`, processed and keyed
+    by work id, along with the slice's current total count.
+    """
+    params = {"select": WORK_FIELDS, "filter": f"{slice_filter(country, year)},from_updated_date:{since}"}
+    updates = {}
+    for works, _ in iter_work_pages(params, client, logger):
+        for work in works:
+            row = process_work(work)
+            updates[row["id"]] = row
+
+    # A cheap count query keeps the slice validation in step with OpenAlex
+    data = client.get({"filter": slice_filter(country, year), "per_page": 1, "select": "id"})
+    logger.info(f"{country} {year}: {len(updates)} works updated since {since}.")
+    return updates, data["meta"]["count"]
+
+
+def upsert_slice(
+    output_file: str, updates: Dict[str, Dict], insert_ids: Optional[List[str]] = None
+) -> Tuple[int, int, int]:
+    """
+    Replaces the rows of a slice CSV whose id has an update, and appends new works:
+    those in `insert_ids`, or every update not yet in the file when it is None.
+    The file is rewritten atomically. Returns (replaced, inserted, total rows).
+    """
+    if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
+        df = pd.read_csv(output_file)
+    else:
+        df = pd.DataFrame(columns=["id"])
+
+    present = df["id"].isin(updates.keys())
+    replaced_ids = df.loc[present, "id"].tolist()
+    if insert_ids is None:
+        insert_ids = [work_id for work_id in updates if work_id not in set(replaced_ids)]
+
+    new_rows = [updates[work_id] for work_id in replaced_ids + list(insert_ids)]
+    if not new_rows:
+        return 0, 0, len(df)
+
+    kept = df[~present]
+    new_df = pd.DataFrame(new_rows)
+    df = pd.concat([kept, new_df], ignore_index=True) if len(kept) else new_df
+
+    tmp_file = f"{output_file}.tmp"
+    df.to_csv(tmp_file, index=False)
+    os.replace(tmp_file, output_file)
+    return len(replaced_ids), len(insert_ids), len(df)
+
+
+def refresh_slices(
+    slices: List[Tuple[str, str]],
+    since: str,
+    client: OpenAlexClient,
+    logger: logging.Logger,
+    registry: Optional[WorkRegistry] = None,
+) -> None:
+    """
+    Incrementally refreshes harvested slices: fetches only works updated since the last
+    harvest and upserts them by work id into the slice CSVs.
 
-    # Process counts_by_year: shift years relative to the publication year
-    publication_year = work.get("publication_year")
-    counts_by_year_data = work.get("counts_by_year", [])
-    offset_citations = {}
-    if counts_by_year_data and publication_year:
-        for item in counts_by_year_data:
-            # Compute offset: citation year minus publication year
-            offset = item["year"] - publication_year
-            if offset >= 0:
-                key = f"{offset}_year"
-                offset_citations[key] = item["cited_by_count"]
-            # If offset is negative, skip the entry as it is likely a data error.
-    processed["counts_by_year"] = json.dumps(offset_citations)
-
-    # Convert complex fields to JSON strings
-    processed["authorships"] = json.dumps(processed["authorships"])
-    processed["subfield"] = json.dumps(processed["subfield"])
-    return processed
+    Without a registry, each slice upserts the works its own query returned. With a
+    registry (dedup mode), updated works are replaced wherever they are stored, new
+    works are stored once under the first slice returning them, and every slice's
+    membership file gains the ids it did not list yet.
+    """
+    checkpoints = {}
+    for country, year in slices:
+        output_file = f"{RESULTS_PATH}/open_alex_publications_{country}_{year}.csv"
+        membership_file = None
+        if registry is not None:
+            membership_file = f"{RESULTS_PATH}/work_slices_{country}_{year}.csv"
+        checkpoint = SliceCheckpoint(CHECKPOINT_PATH, country, year, output_file, membership_file)
+        if not checkpoint.complete:
+            logger.warning(f"{country} {year} has no completed harvest to refresh, skipping.")
+            continue
+        checkpoints[(country, year)] = checkpoint
+
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_SLICES) as executor:
+        futures = {
+            key: executor.submit(fetch_updated_slice, *key, since, client, logger)
+            for key in checkpoints
+        }
+        fetched = {key: future.result() for key, future in futures.items()}
+
+    all_updates = {}
+    for updates, _ in fetched.values():
+        all_updates.update(updates)
+
+    for (country, year), checkpoint in checkpoints.items():
+        updates, expected_count = fetched[(country, year)]
+        members = checkpoint.members
+        if registry is None:
+            replaced, inserted, rows = upsert_slice(checkpoint.state["output_file"], updates)
+        else:
+            replaced, inserted, rows = upsert_slice(
+                checkpoint.state["output_file"], all_updates, registry.claim(updates)
+            )
+            membership_file = checkpoint.state["membership_file"]
+            listed = set()
+            if os.path.exists(membership_file):
+                listed = set(pd.read_csv(membership_file, usecols=["work_id"])["work_id"])
+            new_members = [work_id for work_id in updates if work_id not in listed]
+            with open(membership_file, "a", newline="") as f:
+                writer = csv.writer(f)
+                if not listed and members == 0:
+                    writer.writerow(["work_id", "country_code", "publication_year"])
+                writer.writerows((work_id, country, year) for work_id in new_members)
+            members += len(new_members)
+
+        checkpoint.record_rewrite(rows, members, expected_count)
+        logger.info(f"{country} {year}: {replaced} works updated, {inserted} added.")
+
+
+def merge_staged_slice(
+    country: str,
+    year: str,
+    staging_files: List[str],
+    registry: Optional[WorkRegistry] = None,
+) -> None:
+    """
+    Merges the staging CSVs of a slice into its slice CSV and marks it complete.
+    A slice without staging files gets a CSV with only the header.
+    A work found in several partitions keeps its most recently updated version.
+    With a registry, all ids go to the membership file but each work is stored once.
+    """
+    output_file = f"{RESULTS_PATH}/open_alex_publications_{country}_{year}.csv"
+    membership_file = None
+    if registry is not None:
+        membership_file = f"{RESULTS_PATH}/work_slices_{country}_{year}.csv"
+    checkpoint = SliceCheckpoint(CHECKPOINT_PATH, country, year, output_file, membership_file)
+
+    seen = set()
+    rows = 0
+    membership = []
+    with open(output_file, "w", newline="") as out:
+        writer = None
+        # Partitions are sorted oldest first, so read them backwards
+        for staging_file in reversed(staging_files):
+            with open(staging_file, "r", newline="") as f:
+                reader = csv.DictReader(f)
+                if writer is None:
+                    writer = csv.DictWriter(out, fieldnames=reader.fieldnames)
+                    writer.writeheader()
+                for row in reader:
+                    if row["id"] in seen:
+                        continue
+                    seen.add(row["id"])
+                    membership.append(row["id"])
+                    if registry is None or registry.claim([row["id"]]):
+                        writer.writerow(row)
+                        rows += 1
+        if writer is None:
+            # No staged works: still a valid CSV, so that 3_1 can read it
+            csv.DictWriter(out, fieldnames=WORK_COLUMNS).writeheader()
+
+    if membership_file:
+        with open(membership_file, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["work_id", "country_code", "publication_year"])
+            writer.writerows((work_id, country, year) for work_id in membership)
+
+    checkpoint.state["cursor"] = None
+    checkpoint.record_rewrite(rows, len(membership), len(seen))
+    checkpoint.mark_complete()
+
+
+def ingest_snapshot(
+    snapshot_dir: str,
+    slices: List[Tuple[str, str]],
+    logger: logging.Logger,
+    registry: Optional[WorkRegistry] = None,
+) -> str:
+    """
+    Builds the slice CSVs from a local OpenAlex snapshot instead of the API, applying
+    the same type/field/country/year filters and process_work flattening.
+    Returns the newest partition's updated_date, from which a later --refresh can
+    catch up with the API.
+    """
+    partitions = list_partitions(snapshot_dir)
+    if not partitions:
+        raise FileNotFoundError(f"No works partitions found in {snapshot_dir}")
+    logger.info(f"Ingesting {len(partitions)} snapshot partitions from {snapshot_dir}...")
+
+    staging_dir = f"{RESULTS_PATH}/snapshot_staging"
+    countries = sorted({country for country, _ in slices})
+    years = sorted({int(year) for _, year in slices})
+    staged = ingest_partitions(partitions, countries, years, staging_dir, SNAPSHOT_WORKERS)
+
+    for country, year in slices:
+        merge_staged_slice(country, year, staged.get((country, int(year)), []), registry)
+        logger.info(f"{country} {year}: merged from {len(staged.get((country, int(year)), []))} partitions.")
+    shutil.rmtree(staging_dir)
+    return os.path.basename(os.path.dirname(partitions[-1])).split("=", 1)[1]
+
+
+def combine_slices(
+    slices: List[Dict], output_file: str, file_key: str = "output_file", rows_key: str = "rows"
+) -> int:
+    """
+    Concatenates the CSVs of validated slices into one file, copying bytes directly
+    and keeping only the first header. Returns the number of rows written.
+    """
+    rows = 0
+    with open(output_file, "wb") as out:
+        for entry in slices:
+            if entry[rows_key] == 0:
+                continue
+            with open(entry[file_key], "rb") as f:
+                header = f.readline()
+                if rows == 0:
+                    out.write(header)
+                shutil.copyfileobj(f, out)
+            rows += entry[rows_key]
+    return rows
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Collect publication metadata from OpenAlex.")
+    parser.add_argument(
+        "--countries",
+        nargs="+",
+        default=COUNTRY_CODES,
+        help="ISO country codes to harvest (default: every country in mappings.COUNTRY_CODES)",
+    )
+    parser.add_argument(
+        "--snapshot",
+        metavar="DIR",
+        help="read works from a local OpenAlex snapshot directory instead of the API",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="fetch only works updated since the last harvest and upsert them by work id",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        default=DEDUPLICATE,
+        help="store each work once across slices and record slice membership separately",
+    )
+    return parser.parse_args()
 
 
 def main():
     """
     Main function to execute the data retrieval and processing pipeline.
+    Every (country, year) slice is harvested concurrently under one request budget.
     """
+    args = parse_args()
     setup_logging()
     logger = logging.getLogger(__name__)
+    metrics = HarvestMetrics("3_0_publication_meta", unit="works")
+    if PROMETHEUS_PORT:
+        metrics.serve_prometheus(PROMETHEUS_PORT)
 
     try:
-        email = read_email_from_json(EMAIL_FILE_PATH)
-        logger.info("Successfully read email address.")
-
-        for year in PUBLICATION_YEAR:
-            logger.info(f"Starting data retrieval for year {year}...")
-
-            # Configure API parameters
-            params = {
-                "select": "id,doi,title,authorships,publication_year,primary_topic,cited_by_count,counts_by_year",
-                "filter": "type:article,institutions.country_code:{},primary_topic.field.id:17,publication_year:{}".format(
-                    COUNTRY_CODE, year
-                ),
-                "per_page": 25,
-                "mailto": email,  # Uncomment email to be respectful
-            }
-
-            # Fetch all works
-            logger.info("Starting data retrieval from OpenAlex API...")
-            all_works = fetch_all_works(params, logger)
-
-            # Process works
-            logger.info("Processing retrieved works...")
-            processed_works = [process_work(work) for work in all_works]
-
-            # Create and save DataFrame
-            df = pd.DataFrame(processed_works)
-            df.to_csv(f"{RESULTS_PATH}/open_alex_publications_{year}.csv", index=False)
+        started_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+        slices = [(country, year) for country in args.countries for year in PUBLICATION_YEAR]
+
+        # Snapshot ingestion runs without network access
+        if not args.snapshot:
+            email = read_email_from_json(EMAIL_FILE_PATH)
+            logger.info("Successfully read email address.")
+
+            client = OpenAlexClient(
+                email=email,
+                api_key=read_api_key_from_json(EMAIL_FILE_PATH),
+                requests_per_second=REQUESTS_PER_SECOND,
+                max_in_flight=MAX_IN_FLIGHT,
+                metrics=metrics,
+                logger=logger,
+            )
+
+        registry = None
+        if args.dedup:
+            if PAGING_MODE != "cursor":
+                raise ValueError("Dedup mode requires cursor paging.")
+            # Slices rebuilt from a snapshot must not count their own previous rows as stored
+            exclude = set(slices) if args.snapshot else ()
+            registry = WorkRegistry.from_checkpoints(CHECKPOINT_PATH, exclude)
+            logger.info(f"Dedup mode: {len(registry)} works already stored.")
+
+        failures = 0
+        if args.snapshot:
+            started_at = ingest_snapshot(args.snapshot, slices, logger, registry)
+        elif args.refresh:
+            since = read_last_harvest()
+            if since is None:
+                raise ValueError("No previous harvest recorded; run a full harvest first.")
+            logger.info(f"Refreshing works updated since {since}...")
+            refresh_slices(slices, since, client, logger, registry)
+        else:
+            with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_SLICES) as executor:
+                futures = [
+                    executor.submit(harvest_slice, country, year, client, logger, registry)
+                    for country, year in slices
+                ]
+                for (country, year), future in zip(slices, futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        failures += 1
+                        logger.error(f"Harvest of {country} {year} failed: {e}")
+
+        # List the slices that are complete and consistent with their CSVs
+        manifest = write_manifest(CHECKPOINT_PATH, MANIFEST_FILE)
+        logger.info(
+            f"Manifest written to {MANIFEST_FILE}: {len(manifest['slices'])} valid, "
+            f"{len(manifest['invalid'])} invalid, {len(manifest['incomplete'])} incomplete slices."
+        )
+        if failures:
+            raise RuntimeError(f"{failures} slices failed; rerun to resume them.")
+
+        # Write the combined dataset of the requested slices
+        requested = {(country, str(year)) for country, year in slices}
+        done = [e for e in manifest["slices"] if (e["country"], e["year"]) in requested]
+        rows = combine_slices(done, COMBINED_FILE)
+        logger.info(f"Combined dataset saved to {COMBINED_FILE} with {rows} entries.")
+        if args.dedup:
+            members = combine_slices(
+                done, COMBINED_MEMBERSHIP_FILE, "membership_file", "members"
+            )
             logger.info(
-                f"Data saved to 'open_alex_publications_{year}_{COUNTRY_CODE}.csv' with {len(df)} entries."
+                f"Slice membership saved to {COMBINED_MEMBERSHIP_FILE} with {members} entries."
             )
+        elif os.path.exists(COMBINED_MEMBERSHIP_FILE):
+            # Left by an earlier dedup run; it does not describe this dataset
+            os.remove(COMBINED_MEMBERSHIP_FILE)
+            logger.info("Removed the slice membership of a previous dedup run.")
+
+        # Later refreshes only need works updated after this run started
+        write_last_harvest(started_at, args.dedup)
 
     except Exception as e:
         logger.error(f"Script failed: {e}")
         raise
+    finally:
+        summary = metrics.summary()
+        metrics_file = f"{METRICS_PATH}/3_0_{time.strftime('%Y%m%dT%H%M%S')}.json"
+        metrics.write_json(metrics_file)
+        metrics.close()
+        logger.info(
+            f"{summary['requests']} requests ({summary['retries']} retries, "
+            f"{summary['throttled_429']} throttled), {summary['works']} works in "
+            f"{summary['elapsed_seconds']:.0f}s; metrics written to {metrics_file}"
+        )
 
 
 if __name__ == "__main__":
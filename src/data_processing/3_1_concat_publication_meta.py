@@ -1,7 +1,21 @@
+import json
+import os
 import pandas as pd
+from utils.consolidate import StreamingCsvWriter, iter_unique_chunks
+from utils.author_profiles import write_author_profiles
+from utils.works_store import write_works_store
 
-FILES_PATH = "../../data/raw/publication_meta/openalex_publications"
+FILES_PATH = "../../data/raw/publication_meta/open_alex_publications"
+COUNTRY_CODE = "BR"
 OUTPUT_FILE = "../../data/raw/publication_meta/br_publication_meta.csv"
+# Columnar store of the same works, read by the network and analysis stages
+STORE_PATH = "../../data/raw/publication_meta/br_store"
+
+# Written by 3_0 in dedup mode, where a work is stored under only one country's slice
+COMBINED_FILE = "../../data/raw/publication_meta/publication_meta.csv"
+MEMBERSHIP_FILE = "../../data/raw/publication_meta/work_slices.csv"
+# Records whether the last harvest of 3_0 ran in dedup mode
+HARVEST_STATE_FILE = "../../data/raw/publication_meta/harvest_state.json"
 
 PUBLICATION_YEAR = [
     "2024",
@@ -16,17 +30,56 @@ PUBLICATION_YEAR = [
     "2015"
 ]
 
+def country_work_ids(membership_df, country_code, years):
+    """
+    Ids of the works that the (country, year) slice queries returned,
+    using the slice membership table of a deduplicated harvest.
+    """
+    years = [int(year) for year in years]
+    members = membership_df[
+        (membership_df["country_code"] == country_code)
+        & (membership_df["publication_year"].isin(years))
+    ]
+    return set(members["work_id"])
+
+def harvested_with_dedup():
+    """
+    Whether the last harvest of 3_0 ran in dedup mode. Harvest states written before
+    the mode was recorded fall back to the presence of the membership file.
+    """
+    if os.path.exists(HARVEST_STATE_FILE):
+        with open(HARVEST_STATE_FILE, "r") as f:
+            dedup = json.load(f).get("dedup")
+        if dedup is not None:
+            return dedup
+    return os.path.exists(MEMBERSHIP_FILE)
+
 def main():
-    # Load and store each year's DataFrame in a list
-    dfs = [pd.read_csv(f"{FILES_PATH}_{year}.csv") for year in PUBLICATION_YEAR]
+    # Files are streamed chunk by chunk into the CSV and the works store, keeping the
+    # first row of every work id (a work can appear in more than one year file)
+    skipped = []
+    if harvested_with_dedup():
+        # Deduplicated harvest: pick the country's works from the combined dataset
+        work_ids = country_work_ids(
+            pd.read_csv(MEMBERSHIP_FILE), COUNTRY_CODE, PUBLICATION_YEAR
+        )
+        chunks = (
+            chunk[chunk["id"].isin(work_ids)]
+            for chunk in iter_unique_chunks([COMBINED_FILE], ["id"], skipped=skipped)
+        )
+    else:
+        files = [f"{FILES_PATH}_{COUNTRY_CODE}_{year}.csv" for year in PUBLICATION_YEAR]
+        chunks = iter_unique_chunks(files, ["id"], skipped=skipped)
 
-    # Concatenate all DataFrames into a single DataFrame
-    combined_df = pd.concat(dfs, ignore_index=True)
+    with StreamingCsvWriter(OUTPUT_FILE) as writer:
+        rows = write_works_store((writer.write(chunk) for chunk in chunks), STORE_PATH)
 
-    # Save the combined DataFrame to a new CSV file
-    combined_df.to_csv(OUTPUT_FILE, index=False)
+    print(f"Combined dataset saved to {OUTPUT_FILE} ({sum(skipped)} duplicate works dropped)")
+    print(f"Works store saved to {STORE_PATH}: {rows}")
 
-    print(f"Combined dataset saved to {OUTPUT_FILE}")
+    # Author profiles are computed once here and joined by the network builders
+    authors = write_author_profiles(STORE_PATH)
+    print(f"Profiles of {authors} authors saved to {STORE_PATH}")
 
 if __name__ == "__main__":
     main()
@@ -4,10 +4,39 @@ import networkx as nx
 from itertools import combinations
 from collections import defaultdict
 import os
-from utils import mappings
+from functools import lru_cache
+from utils import author_profiles, collabnet, graph_store, mappings, projections
+from utils.gexf_writer import write_gexf
+from utils.author_profiles import AUTHORSHIPS_COLUMNS, WORKS_COLUMNS
+from utils.large_teams import LargeTeamReport, TeamPolicy
+from utils.parallel import run_sharded
+from utils.works_store import read_ids, read_table, store_exists
 
 INPUT_PATH = "../../data/raw/publication_meta/br_publication_meta.csv"
+# Written by 3_1; used instead of INPUT_PATH when present
+STORE_PATH = "../../data/raw/publication_meta/br_store"
 OUTPUT_PATH = "../../data/graphs/years"
+# The per-subfield graphs of all years, as combined by 4_0, are written by this stage
+# from the yearly graphs it just built; 4_0 then only exports them
+FULL_OUTPUT_PATH = "../../data/graphs/full"
+WRITE_FULL_GRAPHS = True
+# Institution and country networks projected from the author graphs (store builds
+# only), written as <level>/years and <level>/full under PROJECTIONS_OUTPUT_PATH, with
+# a matrix over mappings.COUNTRY_CODES next to every country graph; see utils.projections
+WRITE_PROJECTIONS = True
+PROJECTIONS_OUTPUT_PATH = "../../data/graphs"
+YEARS = list(range(2015, 2025))
+# Pairs of works with many authors (store builds only), e.g.
+# TeamPolicy("fractional", max_team_size=100, large_teams="star"); see utils.large_teams
+TEAM_POLICY = TeamPolicy()
+# Processes building the store graphs, one subfield at a time each (None: all cores,
+# 1: everything in one pass in this process)
+WORKERS = None
+# Graphs are always written in the binary format read by 4_0 and 5_0;
+# GEXF copies are only needed to open the yearly graphs in Gephi
+WRITE_GEXF = False
+# Write the GEXF copies gzip-compressed (.gexf.gz), which Gephi opens directly
+GEXF_GZIP = False
 
 def parse_json_field(field_str):
     try:
@@ -82,27 +111,155 @@ def filter_subfield_publications(df: pd.DataFrame, subfield: str) -> pd.DataFram
 def filter_publications_by_year(df: pd.DataFrame, year: int) -> pd.DataFrame:
     return df[df["publication_year"] == year]
 
+def write_graph(graph, output_path, name):
+    """Writes a graph in the binary format, and as GEXF if WRITE_GEXF."""
+    graph_path = f"{output_path}/{name}{graph_store.GRAPH_SUFFIX}"
+    graph_store.write_graph(graph, graph_path)
+    print(f"Graph successfully written to {graph_path}")
+    if WRITE_GEXF:
+        output_file = f"{output_path}/{name}.gexf" + (".gz" if GEXF_GZIP else "")
+        try:
+            write_gexf(graph, output_file)
+            print(f"Graph successfully written to {output_file}")
+        except Exception as e:
+            print(f"Error writing GEXF file: {e}")
+
+@lru_cache(maxsize=None)
+def store_ids():
+    """The store's ID dictionary, loaded once per process."""
+    return read_ids(STORE_PATH)
+
+def build_store_networks(subfields):
+    """
+    Builds the graphs of the given subfields for every year in one pass over the
+    store's works. Returns a dict (subfield, year) -> graph, with the slices without
+    works missing, and the unit memberships of every projection level per subfield
+    and year (empty if not WRITE_PROJECTIONS).
+    """
+    scope = {"subfields": subfields, "years": YEARS}
+    works = read_table(STORE_PATH, "works", WORKS_COLUMNS, **scope)
+    authorships = read_table(
+        STORE_PATH, "authorships", [*AUTHORSHIPS_COLUMNS, "institution_code"], **scope
+    )
+    # Materialized by 3_1; computed from the works otherwise
+    activity = None
+    if author_profiles.profiles_exist(STORE_PATH):
+        activity = author_profiles.read_author_activity(STORE_PATH, subfields, YEARS)
+    report = LargeTeamReport(TEAM_POLICY)
+    graphs = collabnet.build_collaboration_networks(
+        works, authorships, store_ids(), activity=activity, policy=TEAM_POLICY, report=report
+    )
+    print(f"Built {len(graphs)} graphs: {report}")
+
+    memberships = {}
+    if WRITE_PROJECTIONS:
+        # Counted from the authorships already read, per subfield and year
+        by = ["subfield_name", "publication_year"]
+        grouped = authorships.merge(works[["work_code", *by]], on="work_code")
+        memberships = {
+            level: projections.unit_memberships(grouped, level, by)
+            for level in projections.LEVELS
+        }
+    return graphs, memberships
+
+def subfield_memberships(memberships, subfield):
+    """The memberships of one subfield, per year, out of build_store_networks'."""
+    return {
+        level: frame[frame["subfield_name"] == subfield].drop(columns="subfield_name")
+        for level, frame in memberships.items()
+    }
+
+def write_projections(graph, memberships, output_dir, name):
+    """
+    Writes the projections of an author graph (GraphArrays) under
+    PROJECTIONS_OUTPUT_PATH/<level>/<output_dir>, and the country matrix.
+    """
+    for level, projection in projections.project_levels(
+        graph, memberships, store_ids()
+    ).items():
+        output_path = f"{PROJECTIONS_OUTPUT_PATH}/{level}/{output_dir}"
+        write_graph(projection, output_path, name)
+        if level == "countries":
+            matrix_file = f"{output_path}/{name}_matrix.csv"
+            projections.country_matrix(projection).to_csv(matrix_file)
+            print(f"Country matrix successfully written to {matrix_file}")
+
+def write_subfield_graphs(subfield, yearly, memberships=None):
+    """
+    Writes the yearly graphs of a subfield ((year, nx.Graph) pairs) and, if
+    WRITE_FULL_GRAPHS, the full graph composed from them. With the subfield's
+    memberships (see subfield_memberships), their projections are written too.
+    """
+    yearly_graphs = []
+    for year, G in yearly:
+        graph = graph_store.from_networkx(G)
+        name = graph_store.graph_name(subfield, year)
+        write_graph(graph, OUTPUT_PATH, name)
+        yearly_graphs.append(graph)
+        if memberships:
+            year_memberships = {
+                level: frame[frame["publication_year"] == year]
+                for level, frame in memberships.items()
+            }
+            write_projections(graph, year_memberships, "years", name)
+
+    if WRITE_FULL_GRAPHS:
+        # The graph of 4_0, composed from the yearly graphs instead of reading them back
+        full_graph = graph_store.compose_graphs(yearly_graphs)
+        name = graph_store.graph_name(subfield)
+        write_graph(full_graph, FULL_OUTPUT_PATH, name)
+        if memberships:
+            full_memberships = {
+                level: projections.combine_memberships([frame.drop(columns="publication_year")])
+                for level, frame in memberships.items()
+            }
+            write_projections(full_graph, full_memberships, "full", name)
+
+def build_and_write_subfield(subfield):
+    """
+    Worker of the parallel mode: reads the store partitions of one subfield, builds its
+    graphs and writes them. Returns the number of graphs written.
+    """
+    graphs, memberships = build_store_networks([subfield])
+    write_subfield_graphs(
+        subfield,
+        [(year, graphs.get((subfield, year), nx.Graph())) for year in YEARS],
+        subfield_memberships(memberships, subfield),
+    )
+    return len(YEARS)
+
 def main():
+    subfields = list(mappings.SUBFIELDS_SHORT.keys())
+    if store_exists(STORE_PATH):
+        if WORKERS == 1:
+            graphs, memberships = build_store_networks(subfields)
+            for subfield in subfields:
+                write_subfield_graphs(
+                    subfield,
+                    [(year, graphs.get((subfield, year), nx.Graph())) for year in YEARS],
+                    subfield_memberships(memberships, subfield),
+                )
+        else:
+            # Workers get a subfield name and read its partitions themselves
+            written = run_sharded(build_and_write_subfield, subfields, WORKERS)
+            print(f"Wrote {sum(written.values())} yearly graphs of {len(written)} subfields")
+        return
+
     try:
         full_df = pd.read_csv(INPUT_PATH)
     except Exception as e:
         print(f"Error reading CSV file: {e}")
         return
 
-    for subfield in mappings.SUBFIELDS_SHORT.keys():
+    for subfield in subfields:
         subfield_df = filter_subfield_publications(full_df, subfield)
-
-        for year in range(2015, 2025):
-            df = filter_publications_by_year(subfield_df, year)
-            G = build_collaboration_network(df)
-
-            sanitized_subfield = subfield.replace(" ", "_")
-            output_file = f"{OUTPUT_PATH}/{sanitized_subfield}_{year}.gexf"
-            try:
-                nx.write_gexf(G, output_file)
-                print(f"Graph successfully written to {output_file}")
-            except Exception as e:
-                print(f"Error writing GEXF file: {e}")
+        write_subfield_graphs(
+            subfield,
+            [
+                (year, build_collaboration_network(filter_publications_by_year(subfield_df, year)))
+                for year in YEARS
+            ],
+        )
 
 if __name__ == "__main__":
     main()
@@ -4,11 +4,41 @@ import networkx as nx
 from itertools import combinations
 from collections import defaultdict
 import os, sys
-from utils import mappings
+from utils import author_profiles, collabnet, graph_store, mappings, projections, sparse_collabnet
+from utils.gexf_writer import write_gexf
+from utils.author_profiles import AUTHORSHIPS_COLUMNS, WORKS_COLUMNS
+from utils.consolidate import CHUNK_SIZE
+from utils.id_dictionary import IdDictionary
+from utils.large_teams import LargeTeamReport, TeamPolicy
+from utils.works_store import (
+    normalize_works,
+    read_ids,
+    read_index,
+    read_partition,
+    read_table,
+    store_exists,
+)
 
 INPUT_PATH = "../../data/raw/publication_meta/br_publication_meta.csv"
+# Written by 3_1; used instead of INPUT_PATH when present
+STORE_PATH = "../../data/raw/publication_meta/br_store"
 OUTPUT_PATH = "../../data/graphs"
 NUM_CITATIONS = 100
+# Build the network one store partition (or CSV chunk of CHUNK_SIZE rows) at a time,
+# for datasets that do not fit in memory; the graph is the same
+CHUNKED = False
+# Build the in-memory store network with the sparse-matrix engine (utils.sparse_collabnet):
+# same graph, edges in another order; see benchmark_collabnet.py
+SPARSE_ENGINE = False
+# Pairs of works with many authors (store and chunked builds), e.g.
+# TeamPolicy("fractional", max_team_size=100, large_teams="star"); see utils.large_teams
+TEAM_POLICY = TeamPolicy()
+# Institution and country networks projected from the author graph (store and chunked
+# builds), written to OUTPUT_PATH/<level>, with the matrix of mappings.COUNTRY_CODES
+# next to the country graph; see utils.projections
+WRITE_PROJECTIONS = True
+# Write the GEXF gzip-compressed (.gexf.gz), which Gephi opens directly
+GEXF_GZIP = False
 
 
 def parse_json_field(field_str):
@@ -169,35 +199,160 @@ def filter_publications_by_year(df: pd.DataFrame, year: int) -> pd.DataFrame:
     return filtered_df
 
 
+def count_memberships(works: pd.DataFrame, authorships: pd.DataFrame, memberships: dict) -> dict:
+    """
+    Adds the unit memberships of the works' authorships to `memberships` (level ->
+    counts, empty to start) if WRITE_PROJECTIONS, and returns them.
+    """
+    if not WRITE_PROJECTIONS:
+        return memberships
+    authorships = authorships[authorships["work_code"].isin(works["work_code"])]
+    return {
+        level: projections.combine_memberships(
+            [
+                memberships.get(level, pd.DataFrame()),
+                projections.unit_memberships(authorships, level),
+            ]
+        )
+        for level in projections.LEVELS
+    }
+
+
+def build_collaboration_network_chunked(use_store: bool, report=None):
+    """
+    Builds the network of build_collaboration_network chunk by chunk: from the store
+    partitions if use_store, else from the CSV read CHUNK_SIZE rows at a time. Only the
+    edge and author activity tables (and the unit memberships) are kept in memory.
+
+    Returns:
+        tuple: the graph, the ID dictionary of its codes and the unit memberships.
+    """
+    builder = collabnet.ChunkedNetworkBuilder(TEAM_POLICY, report)
+    profiles = None
+    memberships = {}
+    if use_store:
+        ids = read_ids(STORE_PATH)
+        for path in read_index(STORE_PATH)["path"]:
+            works = read_partition(STORE_PATH, path, "works", [*WORKS_COLUMNS, "cited_by_count"])
+            # works = filter_publications_by_citation_count(works, NUM_CITATIONS)
+            authorships = read_partition(
+                STORE_PATH, path, "authorships", [*AUTHORSHIPS_COLUMNS, "institution_code"]
+            )
+            builder.add(works, authorships)
+            memberships = count_memberships(works, authorships, memberships)
+        if author_profiles.profiles_exist(STORE_PATH):
+            profiles = author_profiles.read_author_profiles(STORE_PATH)
+    else:
+        # The CSV chunks are normalized like the store, numbering the works in input order
+        ids = IdDictionary()
+        start = 0
+        for chunk in pd.read_csv(INPUT_PATH, chunksize=CHUNK_SIZE):
+            # chunk = filter_publications_by_citation_count(chunk, NUM_CITATIONS)
+            tables = normalize_works(chunk, ids, start=start)
+            start += len(chunk)
+            builder.add(tables["works"], tables["authorships"])
+            memberships = count_memberships(tables["works"], tables["authorships"], memberships)
+    G = builder.network(ids, with_publication_count=True, profiles=profiles)
+    return G, ids, memberships
+
+
+def write_projections(graph, ids: IdDictionary, memberships: dict) -> None:
+    """
+    Writes the institution and country projections of the author graph (GraphArrays)
+    to OUTPUT_PATH/<level>, with the country matrix.
+    """
+    for level, projection in projections.project_levels(graph, memberships, ids).items():
+        graph_path = f"{OUTPUT_PATH}/{level}/collabnet_br{graph_store.GRAPH_SUFFIX}"
+        graph_store.write_graph(projection, graph_path)
+        print(f"Graph successfully written to {graph_path}")
+        output_file = f"{OUTPUT_PATH}/{level}/collabnet_br.gexf" + (".gz" if GEXF_GZIP else "")
+        write_gexf(projection, output_file)
+        print(f"Graph successfully written to {output_file}")
+        if level == "countries":
+            matrix_file = f"{OUTPUT_PATH}/{level}/collabnet_br_matrix.csv"
+            projections.country_matrix(projection).to_csv(matrix_file)
+            print(f"Country matrix successfully written to {matrix_file}")
+
+
 def main():
     """
     Main function that loads the publications data, builds the collaboration network,
     and saves the network as a GEXF file.
     """
-    # Load the CSV file into a pandas DataFrame.
-    # Adjust the file name/path as needed.
-    try:
-        full_df = pd.read_csv(INPUT_PATH)
-    except Exception as e:
-        print(f"Error reading CSV file: {e}")
-        return
+    # Build the network from the columnar store if 3_1 wrote one, else from the CSV
+    report = LargeTeamReport(TEAM_POLICY)
+    # Unit memberships of the projections, with the dictionary of their codes; none
+    # for the CSV build
+    ids, memberships = None, {}
+    if CHUNKED:
+        G, ids, memberships = build_collaboration_network_chunked(store_exists(STORE_PATH), report)
+    elif store_exists(STORE_PATH):
+        works = read_table(
+            STORE_PATH,
+            "works",
+            ["work_code", "work_index", "publication_year", "subfield_name", "cited_by_count"],
+        )
+        authorships = read_table(
+            STORE_PATH,
+            "authorships",
+            ["work_code", "position", "author_code", "institution_code", "country"],
+        )
+        # works = filter_publications_by_citation_count(works, NUM_CITATIONS)
+        # Dataset-wide profiles written by 3_1; with a filter, label the authors by
+        # their filtered works instead (profiles=None)
+        profiles = None
+        if author_profiles.profiles_exist(STORE_PATH):
+            profiles = author_profiles.read_author_profiles(STORE_PATH)
+        ids = read_ids(STORE_PATH)
+        engine = sparse_collabnet if SPARSE_ENGINE else collabnet
+        G = engine.build_collaboration_network(
+            works,
+            authorships,
+            ids,
+            with_publication_count=True,
+            profiles=profiles,
+            policy=TEAM_POLICY,
+            report=report,
+        )
+        memberships = count_memberships(works, authorships, memberships)
+    else:
+        # Load the CSV file into a pandas DataFrame.
+        # Adjust the file name/path as needed.
+        try:
+            full_df = pd.read_csv(INPUT_PATH)
+        except Exception as e:
+            print(f"Error reading CSV file: {e}")
+            return
+
+        df = full_df
+        # df = filter_publications_by_citation_count(full_df, NUM_CITATIONS)
 
-    df = full_df
-    # df = filter_publications_by_citation_count(full_df, NUM_CITATIONS)
+        # Build the collaboration network graph
+        G = build_collaboration_network(df)
 
-    # Build the collaboration network graph
-    G = build_collaboration_network(df)
+    if report.works:
+        print(f"Collaboration network built: {report}")
 
     # Write the graph to a GEXF file for visualization (e.g., in Gephi)
     # output_file = str(f"{OUTPUT_PATH}/collabnet_{NUM_CITATIONS}_cit.gexf")
-    output_file = str(f"{OUTPUT_PATH}/collabnet_br.gexf")
+    output_file = str(f"{OUTPUT_PATH}/collabnet_br.gexf") + (".gz" if GEXF_GZIP else "")
+
+    # Binary copy for later stages, which load it without parsing XML
+    graph = graph_store.from_networkx(G)
+    graph_path = f"{OUTPUT_PATH}/collabnet_br{graph_store.GRAPH_SUFFIX}"
+    graph_store.write_graph(graph, graph_path)
+    print(f"Graph successfully written to {graph_path}")
 
     try:
-        nx.write_gexf(G, output_file)
+        # Streamed node by node rather than built as one XML tree
+        write_gexf(graph, output_file)
         print(f"Graph successfully written to {output_file}")
     except Exception as e:
         print(f"Error writing GEXF file: {e}")
 
+    if memberships:
+        write_projections(graph, ids, memberships)
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
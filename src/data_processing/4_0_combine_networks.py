@@ -1,39 +1,108 @@
 import os
 import networkx as nx
-from utils import mappings
+from utils import graph_store, mappings
+from utils.gexf_writer import write_gexf
+from utils.parallel import run_sharded
 
 
 GRAPHS_PATH = "../../data/graphs"
+# The combined graphs are opened in Gephi, so they are also exported as GEXF
+WRITE_GEXF = True
+# Write the GEXF copies gzip-compressed (.gexf.gz), which Gephi opens directly
+GEXF_GZIP = False
+# Processes combining and exporting the subfields, one subfield at a time each
+# (None: all cores, 1: in this process)
+WORKERS = None
 
 # Define the range of years
 YEARS = [i for i in range(2015, 2025)]
 
-# Loop over each subfield using the keys from the SUBFIELDS_SHORT mapping
-for subfield in mappings.SUBFIELDS_SHORT.keys():
-    print(f"Processing subfield: {subfield}")
-    # Create an empty graph; change to nx.MultiGraph() if needed
-    full_graph = nx.Graph()
-    
+
+def load_yearly_graph(subfield, year):
+    """
+    Loads the graph of a subfield and year written by 3_2, from the binary format if
+    present, else from GEXF. Returns None if neither exists.
+    """
+    name = graph_store.graph_name(subfield, year)
+    graph_path = f"{GRAPHS_PATH}/years/{name}{graph_store.GRAPH_SUFFIX}"
+    if graph_store.graph_exists(graph_path):
+        return graph_store.read_graph(graph_path)
+    filename = f"{GRAPHS_PATH}/years/{name}.gexf"
+    if os.path.exists(filename):
+        return graph_store.from_networkx(nx.read_gexf(filename))
+    return None
+
+
+def combine_yearly_graphs(subfield):
+    yearly_graphs = []
     for year in YEARS:
-        filename = f"{GRAPHS_PATH}/years/{subfield}_{year}.gexf"
-        if os.path.exists(filename):
-            try:
-                # Read the yearly GEXF graph
-                yearly_graph = nx.read_gexf(filename)
-                # Merge the yearly graph with the full graph
-                full_graph = nx.compose(full_graph, yearly_graph)
-                print(f"  Merged {filename}")
-            except Exception as e:
-                print(f"  Error reading {filename}: {e}")
-        else:
-            print(f"  File {filename} not found.")
-    
-    # Define the output filename
-    sanitized_subfield = subfield.replace(" ", "_")
-    output_filename = f"{GRAPHS_PATH}/full/{sanitized_subfield}.gexf"
-    try:
-        # Write the merged graph to a new GEXF file
-        nx.write_gexf(full_graph, output_filename)
-        print(f"Created {output_filename}\n")
-    except Exception as e:
-        print(f"Error writing {output_filename}: {e}")
\ No newline at end of file
+        try:
+            yearly_graph = load_yearly_graph(subfield, year)
+        except Exception as e:
+            print(f"  Error reading {subfield} {year}: {e}")
+            continue
+        if yearly_graph is None:
+            print(f"  Graph of {subfield} {year} not found.")
+            continue
+        yearly_graphs.append(yearly_graph)
+        print(f"  Merged {subfield} {year}")
+
+    # Merge the yearly graphs as nx.compose would, later years taking precedence
+    return graph_store.compose_graphs(yearly_graphs)
+
+
+def full_graph_is_current(graph_path, yearly_paths):
+    """
+    True if 3_2 already wrote the full graph from the current yearly graphs, i.e. it
+    was written after all of them.
+    """
+    if not graph_store.graph_exists(graph_path):
+        return False
+    written = os.path.getmtime(os.path.join(graph_path, "meta.json"))
+    return all(
+        os.path.getmtime(os.path.join(path, "meta.json")) <= written
+        for path in yearly_paths
+        if graph_store.graph_exists(path)
+    )
+
+
+def combine_subfield(subfield):
+    """
+    Combines (or, if 3_2 already did, loads) the full graph of a subfield and exports it
+    as GEXF. Runs in a worker process in parallel mode: it reads and writes the graph
+    files itself. Returns the number of nodes of the full graph.
+    """
+    print(f"Processing subfield: {subfield}")
+    name = graph_store.graph_name(subfield)
+    graph_path = f"{GRAPHS_PATH}/full/{name}{graph_store.GRAPH_SUFFIX}"
+    yearly_paths = [
+        f"{GRAPHS_PATH}/years/{graph_store.graph_name(subfield, year)}{graph_store.GRAPH_SUFFIX}"
+        for year in YEARS
+    ]
+    if full_graph_is_current(graph_path, yearly_paths):
+        # Built by 3_2 in the same pass as the yearly graphs
+        full_graph = graph_store.read_graph(graph_path)
+        print(f"  Full graph is up to date: {graph_path}")
+    else:
+        full_graph = combine_yearly_graphs(subfield)
+        graph_store.write_graph(full_graph, graph_path)
+        print(f"Created {graph_path}")
+
+    if WRITE_GEXF:
+        output_filename = f"{GRAPHS_PATH}/full/{name}.gexf" + (".gz" if GEXF_GZIP else "")
+        try:
+            # Write the merged graph to a new GEXF file
+            write_gexf(full_graph, output_filename)
+            print(f"Created {output_filename}\n")
+        except Exception as e:
+            print(f"Error writing {output_filename}: {e}")
+    return len(full_graph.nodes)
+
+
+def main():
+    # Loop over each subfield using the keys from the SUBFIELDS_SHORT mapping
+    run_sharded(combine_subfield, mappings.SUBFIELDS_SHORT.keys(), WORKERS)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,16 @@
 import pandas as pd
 import json
+from utils.consolidate import CHUNK_SIZE
+from utils.works_store import read_index, read_partition, read_table, store_exists
 
 
 PUBLICATIONS_PATH = "../../data/raw/publication_meta/br_publication_meta.csv"
+# Written by 3_1; used instead of PUBLICATIONS_PATH when present
+STORE_PATH = "../../data/raw/publication_meta/br_store"
 OUTPUT_PATH = "../../data/processed/4_international_proportion.csv"
+# Tally the publications one store partition (or CSV chunk of CHUNK_SIZE rows) at a
+# time, for datasets that do not fit in memory; the summary is the same
+CHUNKED = False
 
 
 def summarize_subfield_publications(df: pd.DataFrame) -> pd.DataFrame:
@@ -26,6 +33,14 @@ def summarize_subfield_publications(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
         pd.DataFrame: Summary table as described above.
     """
+    return summarize_domestic_publications(classify_subfield_publications(df))
+
+
+def classify_subfield_publications(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns a copy of the publications with 'subfield_display' and boolean
+    'is_domestic' columns, parsed from the 'subfield' and 'authorships' JSON.
+    """
 
     # Helper function to parse the subfield display name
     def get_subfield_display(subfield_json: str):
@@ -54,16 +69,78 @@ def summarize_subfield_publications(df: pd.DataFrame) -> pd.DataFrame:
     df["subfield_display"] = df["subfield"].apply(get_subfield_display)
     df["is_domestic"] = df["authorships"].apply(is_domestic_publication)
 
+    return df
+
+
+def classify_store_publications(works: pd.DataFrame, countries: pd.DataFrame) -> pd.DataFrame:
+    """
+    'subfield_display' and 'is_domestic' of store works: a publication is international
+    if any of its authorship countries is not BR.
+    """
+    international = countries.loc[countries["country"] != "BR", "work_code"].unique()
+    return pd.DataFrame(
+        {
+            "subfield_display": works["subfield_name"],
+            "is_domestic": ~works["work_code"].isin(international),
+        }
+    )
+
+
+def summarize_store_publications(store_path: str) -> pd.DataFrame:
+    """
+    Same summary as summarize_subfield_publications, computed from the columnar works
+    store: a publication is international if any of its authorship countries is not BR.
+    """
+    works = read_table(store_path, "works", ["work_code", "subfield_name"])
+    countries = read_table(store_path, "authorship_countries", ["work_code", "country"])
+    return summarize_domestic_publications(classify_store_publications(works, countries))
+
+
+def summarize_publications_chunked(store_path: str, publications_path: str) -> pd.DataFrame:
+    """
+    Same summary as the in-memory functions, from per-subfield tallies accumulated over
+    the store partitions if there is a store, else over CSV chunks of CHUNK_SIZE rows.
+    """
+    tallies = []
+    if store_exists(store_path):
+        for path in read_index(store_path)["path"]:
+            works = read_partition(store_path, path, "works", ["work_code", "subfield_name"])
+            countries = read_partition(
+                store_path, path, "authorship_countries", ["work_code", "country"]
+            )
+            tallies.append(
+                tally_domestic_publications(classify_store_publications(works, countries))
+            )
+    else:
+        for chunk in pd.read_csv(publications_path, chunksize=CHUNK_SIZE):
+            tallies.append(tally_domestic_publications(classify_subfield_publications(chunk)))
+    return finish_domestic_summary(pd.concat(tallies).groupby("subfield_display").sum())
+
+
+def summarize_domestic_publications(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregates a DataFrame with 'subfield_display' and boolean 'is_domestic' columns
+    into the per-subfield summary table.
+    """
+    return finish_domestic_summary(tally_domestic_publications(df))
+
+
+def tally_domestic_publications(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Domestic and total publication counts per subfield, indexed by 'subfield_display';
+    tallies of separate chunks add up to the tally of the whole dataset.
+    """
     # Group by subfield and compute counts
-    summary = (
-        df.groupby("subfield_display")
-        .agg(
-            domestic_publications=("is_domestic", "sum"),
-            total_publications=("is_domestic", "count"),
-        )
-        .reset_index()
+    return df.groupby("subfield_display").agg(
+        domestic_publications=("is_domestic", "sum"),
+        total_publications=("is_domestic", "count"),
     )
 
+
+def finish_domestic_summary(tally: pd.DataFrame) -> pd.DataFrame:
+    """Turns a tally of tally_domestic_publications into the summary table."""
+    summary = tally.reset_index()
+
     # Calculate international counts and percentages
     summary["international_publications"] = (
         summary["total_publications"] - summary["domestic_publications"]
@@ -90,11 +167,23 @@ def summarize_subfield_publications(df: pd.DataFrame) -> pd.DataFrame:
     return summary
 
 
+def main():
+    if CHUNKED:
+        summary_df = summarize_publications_chunked(STORE_PATH, PUBLICATIONS_PATH)
+        print("Created summary chunk by chunk")
+    elif store_exists(STORE_PATH):
+        summary_df = summarize_store_publications(STORE_PATH)
+        print("Created summary from the works store")
+    else:
+        publications_df = pd.read_csv(PUBLICATIONS_PATH)
+        print("Read publications")
+        summary_df = summarize_subfield_publications(publications_df)
+        print("Created summary")
+    summary_df.sort_values(by=["domestic_percentage", "international_percentage",], inplace=True)
+    summary_df.to_csv(OUTPUT_PATH)
+    print(f"Summary saved to {OUTPUT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
 
-publications_df = pd.read_csv(PUBLICATIONS_PATH)
-print("Read publications")
-summary_df = summarize_subfield_publications(publications_df)
-print("Created summary")
-summary_df.sort_values(by=["domestic_percentage", "international_percentage",], inplace=True)
-summary_df.to_csv(OUTPUT_PATH)
-print(f"Summary saved to {OUTPUT_PATH}")
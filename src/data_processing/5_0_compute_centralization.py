@@ -2,7 +2,7 @@ import pandas as pd
 import networkx as nx
 import numpy as np
 from pathlib import Path
-from utils import mappings
+from utils import graph_store, mappings
 
 
 INPUT_PATH = "../../data/graphs/years/"
@@ -61,7 +61,7 @@ def create_centralization_dataframe(data_dir, subfields, years):
     Parameters:
     -----------
     data_dir : str
-        Directory containing the GEXF files
+        Directory containing the yearly graphs (binary format, or GEXF files)
     subfields : list
         List of subfield names
     years : list
@@ -78,21 +78,25 @@ def create_centralization_dataframe(data_dir, subfields, years):
     # Process each subfield
     for subfield in subfields:
         # Initialize an empty cumulative graph
-        cumulative_G = nx.Graph()
+        cumulative = graph_store.compose_graphs([])
         for year in years:
-            # Construct filename with the subfield name and year
-            filename = f"{subfield}_{year}.gexf"
-            filepath = Path(data_dir) / filename
+            name = graph_store.graph_name(subfield, year)
+            graph_path = Path(data_dir) / f"{name}{graph_store.GRAPH_SUFFIX}"
+            filepath = Path(data_dir) / f"{name}.gexf"
 
             try:
-                # Load the graph for the given year
-                G_year = nx.read_gexf(filepath)
-                # Combine with the cumulative graph (using nx.compose to merge nodes and edges)
-                cumulative_G = nx.compose(cumulative_G, G_year)
-                print(f"Combined: {filename}")
+                # Load the graph for the given year, from the binary format if present
+                if graph_store.graph_exists(graph_path):
+                    G_year = graph_store.read_graph(graph_path)
+                else:
+                    G_year = graph_store.from_networkx(nx.read_gexf(filepath))
+                # Combine with the cumulative graph (merging nodes and edges like nx.compose)
+                cumulative = graph_store.compose_graphs([cumulative, G_year])
+                print(f"Combined: {name}")
             except (FileNotFoundError, IOError) as e:
-                print(f"Warning: Could not load {filename}: {e}")
-            
+                print(f"Warning: Could not load {name}: {e}")
+            cumulative_G = graph_store.to_networkx(cumulative)
+
             # Calculate centralization if the cumulative graph has nodes, otherwise assign NaN
             if cumulative_G.number_of_nodes() > 0:
                 df.at[subfield, year] = betweenness_centralization(cumulative_G)
@@ -0,0 +1,90 @@
+# Benchmarks the dict builder (utils.collabnet) against the sparse-matrix engine
+# (utils.sparse_collabnet) on the works store written by 3_1, on the whole dataset
+# (the 3_3 network) and on every subfield x year slice (the 3_2 networks), and checks
+# that both build the same graphs. Run it from src/data_processing like the scripts:
+#   python benchmark_collabnet.py
+import time
+from utils import collabnet, graph_store, mappings, sparse_collabnet
+from utils.author_profiles import AUTHORSHIPS_COLUMNS, WORKS_COLUMNS
+from utils.works_store import read_ids, read_table, store_exists
+
+STORE_PATH = "../../data/raw/publication_meta/br_store"
+YEARS = list(range(2015, 2025))
+REPEAT = 3
+
+
+def best_time(build, repeat=REPEAT):
+    """Smallest wall time of `repeat` calls, and the result of the last one."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = build()
+        times.append(time.perf_counter() - started)
+    return min(times), result
+
+
+def same_graph(G, H):
+    """Same nodes in the same order with the same attributes, and the same weighted edges."""
+    edges = lambda X: {frozenset((u, v)): w for u, v, w in X.edges(data="weight")}
+    return list(G.nodes(data=True)) == list(H.nodes(data=True)) and edges(G) == edges(H)
+
+
+def benchmark(name, works, authorships, ids, **kwargs):
+    dict_time, G = best_time(
+        lambda: collabnet.build_collaboration_network(works, authorships, ids, **kwargs)
+    )
+    sparse_time, H = best_time(
+        lambda: sparse_collabnet.build_collaboration_network(works, authorships, ids, **kwargs)
+    )
+    # Both engines feeding the binary graph format, which needs no networkx graph
+    dict_arrays_time, _ = best_time(
+        lambda: graph_store.from_networkx(
+            collabnet.build_collaboration_network(works, authorships, ids, **kwargs)
+        )
+    )
+    sparse_arrays_time, _ = best_time(
+        lambda: sparse_collabnet.collaboration_graph_arrays(works, authorships, ids, **kwargs)
+    )
+    if not same_graph(G, H):
+        raise AssertionError(f"{name}: the engines built different graphs")
+    print(
+        f"{name}: {len(works)} works, {G.number_of_nodes()} authors, "
+        f"{G.number_of_edges()} edges\n"
+        f"  nx.Graph      dict {dict_time:7.2f}s  sparse {sparse_time:7.2f}s  "
+        f"x{dict_time / sparse_time:.1f}\n"
+        f"  GraphArrays   dict {dict_arrays_time:7.2f}s  sparse {sparse_arrays_time:7.2f}s  "
+        f"x{dict_arrays_time / sparse_arrays_time:.1f}"
+    )
+    return dict_arrays_time, sparse_arrays_time
+
+
+def main():
+    if not store_exists(STORE_PATH):
+        print(f"No works store at {STORE_PATH}; run 3_1 first.")
+        return
+    ids = read_ids(STORE_PATH)
+
+    works = read_table(STORE_PATH, "works", WORKS_COLUMNS)
+    authorships = read_table(STORE_PATH, "authorships", AUTHORSHIPS_COLUMNS)
+    benchmark("Whole dataset (3_3)", works, authorships, ids, with_publication_count=True)
+
+    dict_total = sparse_total = 0
+    for subfield in mappings.SUBFIELDS_SHORT.keys():
+        for year in YEARS:
+            scope = {"subfields": [subfield], "years": [year]}
+            dict_time, sparse_time = benchmark(
+                f"{subfield} {year}",
+                read_table(STORE_PATH, "works", WORKS_COLUMNS, **scope),
+                read_table(STORE_PATH, "authorships", AUTHORSHIPS_COLUMNS, **scope),
+                ids,
+            )
+            dict_total += dict_time
+            sparse_total += sparse_time
+    print(
+        f"All slices (3_2), GraphArrays: dict {dict_total:.2f}s  sparse {sparse_total:.2f}s  "
+        f"x{dict_total / sparse_total:.1f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
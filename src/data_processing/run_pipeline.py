@@ -0,0 +1,143 @@
+# Runs the numbered scripts as a DAG, skipping stages whose inputs did not change
+# since their last successful run, and running independent branches concurrently.
+# Run it from src/data_processing like the scripts themselves:
+#   python run_pipeline.py [--only 3_2 4_0] [--force 3_0] [--jobs 4] [--dry-run]
+import argparse
+import logging
+import os
+from utils.pipeline import PipelineRunner, Stage
+
+STATE_FILE = "../../data/pipeline_state.json"
+LOG_PATH = "../../logs/pipeline"
+# Shared code hashed into every stage, so a change in utils reruns the stages
+CODE_PATHS = ["../utils/*.py"]
+MAX_WORKERS = 4
+
+PUBLICATION_META = "../../data/raw/publication_meta"
+GRAPHS = "../../data/graphs"
+
+# Stages that query OpenAlex share the "openalex" resource so that only one of them
+# uses the request budget at a time. They have no file inputs: after a successful run
+# they are skipped until their code changes or they are forced with --force.
+STAGES = [
+    Stage(
+        "1",
+        "1_extract_publication_summary_of_countries.py",
+        outputs=["../../data/processed/1_publication_summary_of_countries.csv"],
+        resource="openalex",
+    ),
+    Stage(
+        "2_0",
+        "2_0_count_publications_per_subfield_country.py",
+        inputs=["../../data/external/openalex_unique_subfields.csv"],
+        outputs=["../../data/raw/publication_counts/combined_publication_counts.csv"],
+        resource="openalex",
+    ),
+    Stage(
+        "2_2",
+        "2_2_compute_subfields_percentage.py",
+        inputs=["../../data/raw/publication_counts/combined_publication_counts.csv"],
+        outputs=[
+            "../../data/processed/2_subfield_percentages.csv",
+            "../../data/processed/2_subfield_indicators.csv",
+        ],
+        depends_on=["2_0"],
+    ),
+    Stage(
+        "3_0",
+        "3_0_collect_publication_meta.py",
+        outputs=[f"{PUBLICATION_META}/open_alex_publications_*.csv"],
+        resource="openalex",
+    ),
+    Stage(
+        "3_1",
+        "3_1_concat_publication_meta.py",
+        inputs=[
+            f"{PUBLICATION_META}/open_alex_publications_BR_*.csv",
+            f"{PUBLICATION_META}/publication_meta.csv",
+            f"{PUBLICATION_META}/work_slices.csv",
+            f"{PUBLICATION_META}/harvest_state.json",
+        ],
+        outputs=[f"{PUBLICATION_META}/br_publication_meta.csv", f"{PUBLICATION_META}/br_store"],
+        depends_on=["3_0"],
+    ),
+    Stage(
+        "3_2",
+        "3_2_construct_collabnets_years.py",
+        inputs=[f"{PUBLICATION_META}/br_store"],
+        outputs=[
+            f"{GRAPHS}/years/*.graph",
+            f"{GRAPHS}/full/*.graph",
+            f"{GRAPHS}/institutions/years/*.graph",
+            f"{GRAPHS}/countries/years/*.graph",
+        ],
+        depends_on=["3_1"],
+    ),
+    Stage(
+        "3_3",
+        "3_3_construct_collabnets_filter.py",
+        inputs=[f"{PUBLICATION_META}/br_store"],
+        outputs=[
+            f"{GRAPHS}/collabnet_br.graph",
+            f"{GRAPHS}/institutions/collabnet_br.graph",
+            f"{GRAPHS}/countries/collabnet_br.graph",
+        ],
+        depends_on=["3_1"],
+    ),
+    Stage(
+        "4_0",
+        "4_0_combine_networks.py",
+        inputs=[f"{GRAPHS}/years/*.graph"],
+        outputs=[f"{GRAPHS}/full/*.graph"],
+        depends_on=["3_2"],
+    ),
+    Stage(
+        "4_1",
+        "4_1_calculate_international.py",
+        inputs=[f"{PUBLICATION_META}/br_store"],
+        outputs=["../../data/processed/4_international_proportion.csv"],
+        depends_on=["3_1"],
+    ),
+    Stage(
+        "5_0",
+        "5_0_compute_centralization.py",
+        inputs=[f"{GRAPHS}/years/*.graph"],
+        outputs=["../../data/processed/5_centralization_df.csv"],
+        depends_on=["3_2"],
+    ),
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the pipeline stages that are out of date.")
+    parser.add_argument("--only", nargs="+", help="run only these stages (default: all)")
+    parser.add_argument("--force", nargs="+", default=[], help="run these stages even if up to date")
+    parser.add_argument("--jobs", type=int, default=MAX_WORKERS, help="stages run at the same time")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="only report which stages are out of date"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+
+    workdir = os.path.dirname(os.path.abspath(__file__))
+    runner = PipelineRunner(
+        STAGES,
+        workdir=workdir,
+        state_file=os.path.join(workdir, STATE_FILE),
+        code_paths=CODE_PATHS,
+        log_dir=os.path.join(workdir, LOG_PATH),
+        max_workers=args.jobs,
+    )
+    results = runner.run(only=args.only, force=args.force, dry_run=args.dry_run)
+    for name, result in results.items():
+        print(f"{name}: {result}")
+    if any(result in ("failed", "blocked") for result in results.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
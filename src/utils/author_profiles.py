@@ -0,0 +1,189 @@
+"""
+Per-author profile tables of a works store, computed once per dataset.
+
+The network builders label every author with their country and primary subfield, which
+used to be recounted from the authorships of every graph built. The store keeps two
+tables next to its partitions instead:
+
+    authors/activity.parquet   one row per (author_code, publication_year, subfield_name):
+                               the number of publications and the work_index, position
+                               and country of the author's first authorship in that cell
+    authors/profiles.parquet   one row per author over the whole dataset: publications,
+                               primary_subfield, primary_country, first_year, last_year
+
+A publication is counted once per authorship, and first authorships follow the input
+order of the works (work_index), so the profiles of any set of (year, subfield) cells,
+summarized with `summarize_author_profiles`, are the labels the builders computed from
+the works of those cells.
+"""
+
+import os
+from typing import Optional, Sequence
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from utils.id_dictionary import MISSING
+from utils.works_store import read_index, read_partition
+
+UNKNOWN = "Unknown"
+AUTHORS_DIR = "authors"
+ACTIVITY_FILE = "activity.parquet"
+PROFILES_FILE = "profiles.parquet"
+
+CELL = ["author_code", "publication_year", "subfield_name"]
+# Store columns the activity is computed from
+WORKS_COLUMNS = ["work_code", "work_index", "publication_year", "subfield_name"]
+AUTHORSHIPS_COLUMNS = ["work_code", "position", "author_code", "country"]
+ACTIVITY_COLUMNS = [*CELL, "publications", "first_work_index", "first_position", "first_country"]
+
+
+def author_activity(works: pd.DataFrame, authorships: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregates authorships into one row per author, year and subfield. `works` needs
+    work_code, work_index, publication_year and subfield_name; `authorships` needs
+    work_code, position, author_code and country.
+    """
+    df = authorships.loc[authorships["author_code"] != MISSING, AUTHORSHIPS_COLUMNS].merge(
+        works[WORKS_COLUMNS], on="work_code"
+    )
+    df["subfield_name"] = df["subfield_name"].fillna(UNKNOWN)
+    df["country"] = df["country"].fillna(UNKNOWN)
+    df = df.sort_values(["work_index", "position"], kind="stable")
+
+    activity = (
+        df.groupby(CELL, sort=False, dropna=False)
+        .agg(
+            publications=("work_code", "size"),
+            first_work_index=("work_index", "first"),
+            first_position=("position", "first"),
+            first_country=("country", "first"),
+        )
+        .reset_index()
+    )
+    activity["publications"] = activity["publications"].astype("int64")
+    return activity
+
+
+def empty_activity() -> pd.DataFrame:
+    return pd.DataFrame(columns=ACTIVITY_COLUMNS)
+
+
+def combine_activity(frames: Sequence[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Merges activity rows computed from separate chunks of the works, e.g. to accumulate
+    them with bounded memory: publications are summed and the first authorship of a
+    cell is the one with the lowest work_index.
+    """
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return empty_activity()
+    activity = pd.concat(frames, ignore_index=True)
+    activity = activity.sort_values(["first_work_index", "first_position"], kind="stable")
+    return (
+        activity.groupby(CELL, sort=False, dropna=False)
+        .agg(
+            publications=("publications", "sum"),
+            first_work_index=("first_work_index", "first"),
+            first_position=("first_position", "first"),
+            first_country=("first_country", "first"),
+        )
+        .reset_index()
+    )
+
+
+def summarize_author_profiles(activity: pd.DataFrame) -> pd.DataFrame:
+    """
+    Profiles of the authors over the given activity rows, indexed by author_code in
+    order of first authorship. The primary subfield is the one with most publications,
+    ties going to the subfield the author published in first.
+    """
+    columns = [
+        "publications",
+        "primary_subfield",
+        "primary_country",
+        "first_year",
+        "last_year",
+        "first_work_index",
+        "first_position",
+    ]
+    if activity.empty:
+        return pd.DataFrame(columns=columns, index=pd.Index([], name="author_code"))
+    activity = activity.sort_values(["first_work_index", "first_position"], kind="stable")
+
+    by_author = activity.groupby("author_code", sort=False)
+    profiles = by_author.agg(
+        publications=("publications", "sum"),
+        primary_country=("first_country", "first"),
+        first_year=("publication_year", "min"),
+        last_year=("publication_year", "max"),
+        first_work_index=("first_work_index", "first"),
+        first_position=("first_position", "first"),
+    )
+
+    subfields = (
+        activity.groupby(["author_code", "subfield_name"], sort=False)["publications"]
+        .sum()
+        .reset_index()
+        .sort_values(["author_code", "publications"], ascending=[True, False], kind="stable")
+        .drop_duplicates("author_code")
+        .set_index("author_code")["subfield_name"]
+    )
+    profiles["primary_subfield"] = subfields
+    return profiles[columns]
+
+
+def activity_path(store_dir: str) -> str:
+    return os.path.join(store_dir, AUTHORS_DIR, ACTIVITY_FILE)
+
+
+def profiles_path(store_dir: str) -> str:
+    return os.path.join(store_dir, AUTHORS_DIR, PROFILES_FILE)
+
+
+def profiles_exist(store_dir: str) -> bool:
+    return os.path.exists(profiles_path(store_dir))
+
+
+def write_author_profiles(store_dir: str) -> int:
+    """
+    Computes the activity and profile tables of a store, one partition at a time (a
+    partition holds a single year and subfield, so its activity rows are final).
+
+    Returns:
+        int: number of authors.
+    """
+    frames = []
+    for path in read_index(store_dir)["path"]:
+        frames.append(
+            author_activity(
+                read_partition(store_dir, path, "works", WORKS_COLUMNS),
+                read_partition(store_dir, path, "authorships", AUTHORSHIPS_COLUMNS),
+            )
+        )
+    activity = pd.concat(frames, ignore_index=True) if frames else empty_activity()
+    profiles = summarize_author_profiles(activity)
+
+    os.makedirs(os.path.join(store_dir, AUTHORS_DIR), exist_ok=True)
+    activity.to_parquet(activity_path(store_dir), index=False)
+    profiles.reset_index().to_parquet(profiles_path(store_dir), index=False)
+    return len(profiles)
+
+
+def read_author_activity(
+    store_dir: str,
+    subfields: Optional[Sequence[str]] = None,
+    years: Optional[Sequence[int]] = None,
+) -> pd.DataFrame:
+    """Activity rows of the given subfield names and years (None: all)."""
+    filters = []
+    if subfields is not None:
+        filters.append(("subfield_name", "in", list(subfields)))
+    if years is not None:
+        filters.append(("publication_year", "in", [int(year) for year in years]))
+    return pq.read_table(activity_path(store_dir), filters=filters or None).to_pandas()
+
+
+def read_author_profiles(store_dir: str) -> pd.DataFrame:
+    """Dataset-wide profiles, indexed by author_code."""
+    return pd.read_parquet(profiles_path(store_dir)).set_index("author_code")
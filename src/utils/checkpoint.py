@@ -0,0 +1,230 @@
+"""
+Checkpoints for resumable harvests.
+
+Each (country, year) slice has a small JSON checkpoint recording the cursor of the next
+page to fetch and how many rows and bytes of the slice's CSV were committed. A rerun
+truncates the CSV back to the committed size and resumes from the stored cursor, so a
+failure only costs the page that was in flight. Deduplicated harvests also track the
+slice's work membership file the same way.
+"""
+
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+
+def write_json_atomic(path: str, data: Dict) -> None:
+    """Writes JSON to a temporary file and renames it over `path`."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class SliceCheckpoint:
+    """
+    Progress of one (country, year) harvest slice.
+
+    Attributes stored on disk:
+        cursor: cursor of the next page to fetch ("*" for the first page).
+        rows: number of rows committed to the output CSV.
+        bytes: size of the output CSV after the last committed page.
+        expected_count: `meta.count` reported by OpenAlex for the slice.
+        complete: True once the last page was committed.
+        membership_file: CSV of every work id the slice query returned (dedup mode only),
+            with its committed `members` rows and `membership_bytes`.
+    """
+
+    def __init__(
+        self,
+        checkpoint_dir: str,
+        country: str,
+        year: str,
+        output_file: str,
+        membership_file: Optional[str] = None,
+    ):
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        self.path = os.path.join(checkpoint_dir, f"{country}_{year}.json")
+        self.state = {
+            "country": country,
+            "year": str(year),
+            "output_file": output_file,
+            "cursor": "*",
+            "rows": 0,
+            "bytes": 0,
+            "expected_count": None,
+            "complete": False,
+            "membership_file": membership_file,
+            "members": 0,
+            "membership_bytes": 0,
+        }
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                self.state.update(json.load(f))
+
+    @property
+    def complete(self) -> bool:
+        return self.state["complete"]
+
+    @property
+    def cursor(self) -> str:
+        return self.state["cursor"]
+
+    @property
+    def rows(self) -> int:
+        return self.state["rows"]
+
+    @property
+    def members(self) -> int:
+        return self.state["members"]
+
+    @staticmethod
+    def _truncate(path: Optional[str], size: int) -> None:
+        if not path or not os.path.exists(path):
+            return
+        if size == 0:
+            os.remove(path)
+        elif os.path.getsize(path) > size:
+            os.truncate(path, size)
+
+    def prepare_output(self) -> None:
+        """
+        Drops anything written to the output files after the last committed page.
+        Starts the files from scratch when nothing was committed yet.
+        """
+        self._truncate(self.state["output_file"], self.state["bytes"])
+        self._truncate(self.state["membership_file"], self.state["membership_bytes"])
+
+    def commit(
+        self, next_cursor: Optional[str], rows: int, expected_count: int, members: int = 0
+    ) -> None:
+        """Records a page as durably written to the output files."""
+        output_file = self.state["output_file"]
+        membership_file = self.state["membership_file"]
+        self.state.update(
+            cursor=next_cursor,
+            rows=self.state["rows"] + rows,
+            bytes=os.path.getsize(output_file) if os.path.exists(output_file) else 0,
+            expected_count=expected_count,
+            members=self.state["members"] + members,
+            membership_bytes=(
+                os.path.getsize(membership_file)
+                if membership_file and os.path.exists(membership_file)
+                else 0
+            ),
+            updated_at=datetime.now(timezone.utc).isoformat(),
+        )
+        write_json_atomic(self.path, self.state)
+
+    def record_rewrite(self, rows: int, members: int, expected_count: Optional[int]) -> None:
+        """Records new sizes after the output files were rewritten in place (e.g. upserts)."""
+        output_file = self.state["output_file"]
+        membership_file = self.state["membership_file"]
+        self.state.update(
+            rows=rows,
+            bytes=os.path.getsize(output_file) if os.path.exists(output_file) else 0,
+            members=members,
+            membership_bytes=(
+                os.path.getsize(membership_file)
+                if membership_file and os.path.exists(membership_file)
+                else 0
+            ),
+            updated_at=datetime.now(timezone.utc).isoformat(),
+        )
+        if expected_count is not None:
+            self.state["expected_count"] = expected_count
+        write_json_atomic(self.path, self.state)
+
+    def mark_complete(self) -> None:
+        self.state.update(
+            complete=True, updated_at=datetime.now(timezone.utc).isoformat()
+        )
+        write_json_atomic(self.path, self.state)
+
+
+def load_checkpoints(checkpoint_dir: str) -> List[Dict]:
+    """Returns the stored state of every slice checkpoint in a directory."""
+    states = []
+    if not os.path.isdir(checkpoint_dir):
+        return states
+    for file_name in sorted(os.listdir(checkpoint_dir)):
+        if not file_name.endswith(".json"):
+            continue
+        with open(os.path.join(checkpoint_dir, file_name), "r") as f:
+            state = json.load(f)
+        state.setdefault("membership_file", None)
+        state.setdefault("members", 0)
+        states.append(state)
+    return states
+
+
+def read_committed_ids(path: Optional[str], rows: int, column: str = "id") -> pd.Series:
+    """Reads the id column of the first `rows` committed rows of a slice CSV."""
+    if rows == 0 or not path or not os.path.exists(path):
+        return pd.Series([], dtype=str)
+    return pd.read_csv(path, usecols=[column], nrows=rows)[column]
+
+
+def validate_slice(state: Dict) -> List[str]:
+    """
+    Checks a completed slice against its output CSV.
+    In dedup mode, the membership file rather than the output CSV must hold every
+    work OpenAlex reported for the slice.
+    Returns a list of problems; an empty list means the slice is valid.
+    """
+    problems = []
+    output_file = state["output_file"]
+    if state["rows"] and not os.path.exists(output_file):
+        return [f"missing output file {output_file}"]
+
+    ids = read_committed_ids(output_file, state["rows"])
+    if len(ids) != state["rows"]:
+        problems.append(f"{len(ids)} rows on disk, {state['rows']} committed")
+    if ids.duplicated().any():
+        problems.append(f"{ids.duplicated().sum()} duplicated work ids")
+
+    returned = len(ids)
+    if state["membership_file"]:
+        returned = len(read_committed_ids(state["membership_file"], state["members"], "work_id"))
+        if returned != state["members"]:
+            problems.append(f"{returned} memberships on disk, {state['members']} committed")
+    if state["expected_count"] is not None and returned != state["expected_count"]:
+        problems.append(f"{returned} works on disk, {state['expected_count']} reported by OpenAlex")
+    return problems
+
+
+def write_manifest(checkpoint_dir: str, manifest_path: str) -> Dict:
+    """
+    Validates every completed slice checkpoint and writes a manifest listing them.
+    Slices that are incomplete or fail validation are listed separately.
+    """
+    manifest = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "slices": [],
+        "invalid": [],
+        "incomplete": [],
+    }
+    for state in load_checkpoints(checkpoint_dir):
+        entry = {
+            "country": state["country"],
+            "year": state["year"],
+            "output_file": state["output_file"],
+            "rows": state["rows"],
+            "membership_file": state["membership_file"],
+            "members": state["members"],
+            "expected_count": state["expected_count"],
+        }
+        if not state["complete"]:
+            manifest["incomplete"].append(entry)
+            continue
+        problems = validate_slice(state)
+        if problems:
+            manifest["invalid"].append({**entry, "problems": problems})
+        else:
+            manifest["slices"].append(entry)
+
+    write_json_atomic(manifest_path, manifest)
+    return manifest
@@ -0,0 +1,340 @@
+"""
+Co-authorship network construction from the columnar works store (utils.works_store).
+
+Builds the same graphs as `build_collaboration_network` in the stage 3 scripts, but
+from the `works` and `authorships` tables instead of the JSON columns of the CSVs:
+nodes are authors with 'label1' (country of their first authorship), 'label2'
+(primary subfield) and optionally 'label3' (publication count); edges are weighted by
+the number of co-authored works.
+
+Node labels come from the author profiles (utils.author_profiles) of the graph's
+works, read from the store's materialized tables or summarized from the works when
+none are given. Edges are accumulated by the two author codes packed into one 64-bit
+integer; the original author IDs are only restored when the networkx graph is built.
+
+All builders take a TeamPolicy (utils.large_teams) for works with many authors, and
+count the pairs it avoided in a LargeTeamReport when one is given.
+
+`build_collaboration_networks` builds the graphs of many groups of works (every
+subfield and year) in a single pass. `ChunkedNetworkBuilder` builds the same graph from chunks of the works (e.g. one store
+partition or CSV chunk at a time), keeping only the edge and author activity tables
+of the works seen so far in memory.
+"""
+
+from collections import defaultdict
+from itertools import combinations
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from utils.author_profiles import (
+    UNKNOWN,
+    author_activity,
+    combine_activity,
+    empty_activity,
+    summarize_author_profiles,
+)
+from utils.id_dictionary import MISSING, IdDictionary
+from utils.large_teams import LargeTeamReport, TeamPolicy, is_large, pair_weight
+
+
+def pack_edge(code1: int, code2: int) -> int:
+    """Packs an undirected pair of codes into one integer, smaller code first."""
+    if code1 > code2:
+        code1, code2 = code2, code1
+    return (code1 << 32) | code2
+
+
+def unpack_edge(key: int):
+    return key >> 32, key & 0xFFFFFFFF
+
+
+def group_authors(authorships: pd.DataFrame) -> dict:
+    """Maps each work code to its [(author_code, country), ...] in authorship order."""
+    authorships = authorships.sort_values(["work_code", "position"], kind="stable")
+    authors = defaultdict(list)
+    for work_code, author_code, country in zip(
+        authorships["work_code"].tolist(),
+        authorships["author_code"].tolist(),
+        authorships["country"],
+    ):
+        authors[work_code].append((author_code, country))
+    return authors
+
+
+def add_work_edges(collaboration_edges: dict, authors: list, policy: TeamPolicy) -> int:
+    """
+    Adds the co-author pairs of one work ([(author_code, country), ...]) to the packed
+    edge counter under the policy. Returns the team size (authors with an ID).
+    """
+    codes = [code for code, _ in authors if code != MISSING]
+    team_size = len(codes)
+    if policy.max_team_size is not None and team_size > policy.max_team_size:
+        if policy.large_teams == "skip":
+            return team_size
+        pairs = ((codes[0], code) for code in codes[1:])
+    else:
+        pairs = combinations(codes, 2)
+    weight = 1 if policy.weighting == "count" else 1 / max(team_size - 1, 1)
+    for code1, code2 in pairs:
+        collaboration_edges[pack_edge(code1, code2)] += weight
+    return team_size
+
+
+# An edge is first seen in the work with the lowest work_index, at the pair of author
+# positions that comes first in itertools.combinations order
+FIRST_SEEN = ["first_work_index", "first_position1", "first_position2"]
+EDGE_COLUMNS = ["key", "weight", *FIRST_SEEN]
+
+
+def empty_edge_table() -> pd.DataFrame:
+    return pd.DataFrame(columns=EDGE_COLUMNS)
+
+
+def combine_edge_tables(tables: Sequence[pd.DataFrame]) -> pd.DataFrame:
+    """Merges edge tables, summing the weights, in order of first appearance."""
+    tables = [table for table in tables if len(table)]
+    if not tables:
+        return empty_edge_table()
+    edges = pd.concat(tables, ignore_index=True).sort_values(FIRST_SEEN, kind="stable")
+    return (
+        edges.groupby("key", sort=False)
+        .agg(
+            weight=("weight", "sum"),
+            first_work_index=("first_work_index", "first"),
+            first_position1=("first_position1", "first"),
+            first_position2=("first_position2", "first"),
+        )
+        .reset_index()
+    )
+
+
+def edge_table(
+    works: pd.DataFrame,
+    authorships: pd.DataFrame,
+    policy: TeamPolicy = TeamPolicy(),
+    report: Optional[LargeTeamReport] = None,
+) -> pd.DataFrame:
+    """
+    Co-authorship edges of a chunk of works (needs work_code and work_index), one row
+    per packed author pair with its weight and where it was first seen.
+    """
+    authors = authorships.loc[
+        authorships["author_code"] != MISSING, ["work_code", "position", "author_code"]
+    ].merge(works[["work_code", "work_index"]], on="work_code")
+    by_work = authors.groupby("work_code")["position"]
+    authors["team_size"] = by_work.transform("size")
+    authors["first_position"] = by_work.transform("min")
+    if report is not None:
+        report.add(by_work.size().reindex(works["work_code"], fill_value=0).to_numpy())
+
+    pairs = authors.merge(
+        authors.drop(columns=["team_size", "first_position"]),
+        on=["work_code", "work_index"],
+        suffixes=("1", "2"),
+    )
+    keep = pairs["position1"] < pairs["position2"]
+    large = is_large(pairs["team_size"].to_numpy(), policy)
+    if policy.large_teams == "skip":
+        keep &= ~large
+    else:
+        # Star: only the pairs of the first author
+        keep &= ~large | (pairs["position1"] == pairs["first_position"]).to_numpy()
+    pairs = pairs[keep]
+
+    code1 = pairs["author_code1"].to_numpy(np.int64)
+    code2 = pairs["author_code2"].to_numpy(np.int64)
+    edges = pd.DataFrame(
+        {
+            "key": (np.minimum(code1, code2) << 32) | np.maximum(code1, code2),
+            "weight": pair_weight(pairs["team_size"].to_numpy(), policy),
+            "first_work_index": pairs["work_index"].to_numpy(),
+            "first_position1": pairs["position1"].to_numpy(),
+            "first_position2": pairs["position2"].to_numpy(),
+        }
+    )
+    return combine_edge_tables([edges])
+
+
+def network_from_profiles(
+    profiles: pd.DataFrame,
+    edges: Iterable[Tuple[int, int]],
+    ids: IdDictionary,
+    with_publication_count: bool = False,
+) -> nx.Graph:
+    """
+    Builds the networkx graph of the profiled authors (in profile order) and the
+    (packed key, weight) edges, labelling the nodes with the original author IDs.
+    """
+    author_ids = dict(zip(profiles.index, ids.decode("authors", profiles.index)))
+
+    G = nx.Graph()
+    columns = ["primary_country", "primary_subfield", "publications"]
+    for author_code, country, subfield, publications in zip(
+        profiles.index, *(profiles[column].tolist() for column in columns)
+    ):
+        attributes = {"label1": country, "label2": subfield}
+        if with_publication_count:
+            attributes["label3"] = int(publications)
+        G.add_node(author_ids[author_code], **attributes)
+
+    for key, weight in edges:
+        code1, code2 = unpack_edge(key)
+        G.add_edge(author_ids[code1], author_ids[code2], weight=weight)
+
+    return G
+
+
+def build_collaboration_network(
+    works: pd.DataFrame,
+    authorships: pd.DataFrame,
+    ids: IdDictionary,
+    with_publication_count: bool = False,
+    profiles: Optional[pd.DataFrame] = None,
+    policy: TeamPolicy = TeamPolicy(),
+    report: Optional[LargeTeamReport] = None,
+) -> nx.Graph:
+    """
+    Builds the co-authorship network of `works` (needs work_code, and work_index,
+    publication_year and subfield_name unless `profiles` is given).
+    `authorships` may hold the authors of more works than `works`; only the authors
+    of the given works are used. `ids` is the dictionary of the store, used to label
+    the nodes with the original author IDs.
+    `profiles` are the author profiles of the graph's works, e.g. summarized from the
+    store's activity rows of the graph's subfields and years; the nodes are the profiled
+    authors of the works, in order of first authorship.
+    `policy` only changes the edges of large teams, whose authors remain nodes, and
+    `report` receives the team sizes of the works.
+    """
+    policy.check()
+    authorships = authorships[authorships["work_code"].isin(works["work_code"])]
+    if profiles is None:
+        profiles = summarize_author_profiles(author_activity(works, authorships))
+    else:
+        profiles = profiles[profiles.index.isin(authorships["author_code"])]
+
+    # Edges are added in input order, as works read from several partitions are not
+    if "work_index" in works:
+        works = works.sort_values("work_index")
+    authors_by_work = group_authors(authorships)
+    collaboration_edges = defaultdict(int)
+    team_sizes = [
+        add_work_edges(collaboration_edges, authors_by_work.get(work_code, []), policy)
+        for work_code in works["work_code"].tolist()
+    ]
+    if report is not None:
+        report.add(team_sizes)
+
+    return network_from_profiles(
+        profiles, collaboration_edges.items(), ids, with_publication_count
+    )
+
+
+def build_collaboration_networks(
+    works: pd.DataFrame,
+    authorships: pd.DataFrame,
+    ids: IdDictionary,
+    by: Sequence[str] = ("subfield_name", "publication_year"),
+    with_publication_count: bool = False,
+    activity: Optional[pd.DataFrame] = None,
+    policy: TeamPolicy = TeamPolicy(),
+    report: Optional[LargeTeamReport] = None,
+) -> Dict[tuple, nx.Graph]:
+    """
+    Builds the networks of every group of works (by default every subfield and year)
+    in one pass over the works: the co-author pairs of each work are routed to the edge
+    counter of its group, and the nodes of each group are labelled from the author
+    activity rows of that group. Each graph is the one build_collaboration_network
+    builds from the group's works alone.
+
+    `by` are activity columns (author_profiles.CELL); `activity` are the activity rows
+    of the works, e.g. read from the store, computed from the works if None. `policy`
+    and `report` as in build_collaboration_network.
+
+    Returns:
+        dict: group key tuple -> graph, for every group with works.
+    """
+    policy.check()
+    if "work_index" in works:
+        works = works.sort_values("work_index")
+    works = works.assign(subfield_name=works["subfield_name"].fillna(UNKNOWN))
+    authorships = authorships[authorships["work_code"].isin(works["work_code"])]
+    if activity is None:
+        activity = author_activity(works, authorships)
+    activity_by_group = dict(tuple(activity.groupby(list(by), sort=False)))
+
+    authors_by_work = group_authors(authorships)
+    edges_by_group = defaultdict(lambda: defaultdict(int))
+    team_sizes = []
+    for work_code, *group in zip(works["work_code"].tolist(), *(works[c].tolist() for c in by)):
+        team_sizes.append(
+            add_work_edges(
+                edges_by_group[tuple(group)], authors_by_work.get(work_code, []), policy
+            )
+        )
+    if report is not None:
+        report.add(team_sizes)
+
+    graphs = {}
+    for group, collaboration_edges in edges_by_group.items():
+        group_activity = activity_by_group.get(group, empty_activity())
+        graphs[group] = network_from_profiles(
+            summarize_author_profiles(group_activity),
+            collaboration_edges.items(),
+            ids,
+            with_publication_count,
+        )
+    return graphs
+
+
+class ChunkedNetworkBuilder:
+    """
+    Builds the graph of `build_collaboration_network` from chunks of the works, given
+    in input order or not, with their authorships. Only the edge table and the author
+    activity of the works added so far are kept; the result is the same graph, with
+    nodes and edges in the same order. `policy` and `report` as in
+    build_collaboration_network.
+    """
+
+    def __init__(
+        self, policy: TeamPolicy = TeamPolicy(), report: Optional[LargeTeamReport] = None
+    ):
+        self.policy = policy.check()
+        self.report = report
+        self.edges = empty_edge_table()
+        self.activity = empty_activity()
+        # Chunk tables not merged yet; they are merged once they hold as many rows as
+        # the merged tables, so merging costs O(rows) overall and memory stays within
+        # twice the merged tables plus a chunk
+        self._pending_edges = []
+        self._pending_activity = []
+
+    def add(self, works: pd.DataFrame, authorships: pd.DataFrame) -> None:
+        """Adds works (work_code, work_index, publication_year, subfield_name)."""
+        authorships = authorships[authorships["work_code"].isin(works["work_code"])]
+        self._pending_edges.append(edge_table(works, authorships, self.policy, self.report))
+        self._pending_activity.append(author_activity(works, authorships))
+        if sum(map(len, self._pending_edges)) >= len(self.edges):
+            self._merge()
+
+    def _merge(self) -> None:
+        self.edges = combine_edge_tables([self.edges, *self._pending_edges])
+        self.activity = combine_activity([self.activity, *self._pending_activity])
+        self._pending_edges, self._pending_activity = [], []
+
+    def network(
+        self,
+        ids: IdDictionary,
+        with_publication_count: bool = False,
+        profiles: Optional[pd.DataFrame] = None,
+    ) -> nx.Graph:
+        """The graph of the works added; `profiles` as in build_collaboration_network."""
+        self._merge()
+        if profiles is None:
+            profiles = summarize_author_profiles(self.activity)
+        else:
+            profiles = profiles[profiles.index.isin(self.activity["author_code"])]
+        edges = zip(self.edges["key"].tolist(), self.edges["weight"].tolist())
+        return network_from_profiles(profiles, edges, ids, with_publication_count)
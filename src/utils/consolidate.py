@@ -0,0 +1,72 @@
+"""
+Streaming consolidation of per-slice CSV files.
+
+Input files are read in fixed-size chunks, rows whose key was already seen are
+dropped, and each chunk is appended to the consolidated output before the next one is
+read, so peak memory is one chunk plus the set of keys seen instead of the whole
+dataset (twice, when it is concatenated in pandas).
+"""
+
+import os
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+import pandas as pd
+
+CHUNK_SIZE = 50_000
+
+
+def iter_unique_chunks(
+    paths: Iterable[str],
+    key: Sequence[str],
+    chunksize: int = CHUNK_SIZE,
+    skipped: Optional[List[int]] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Yields the rows of the CSV files in order, chunk by chunk, keeping only the first
+    row of every `key`. The number of dropped duplicates is appended to `skipped`.
+    """
+    key = list(key)
+    seen = set()
+    for path in paths:
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            keys = pd.Series(list(zip(*(chunk[column] for column in key))), index=chunk.index)
+            first = ~keys.duplicated() & ~keys.isin(seen)
+            seen.update(keys[first])
+            if skipped is not None:
+                skipped.append(int((~first).sum()))
+            yield chunk[first]
+
+
+class StreamingCsvWriter:
+    """
+    Appends chunks to a CSV file, writing the header once. The file is written next to
+    `path` and only replaces it when the context exits without an error.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.rows = 0
+        self._header = True
+
+    def __enter__(self) -> "StreamingCsvWriter":
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        return self
+
+    def write(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """Appends a chunk and returns it, so writing can be chained into other sinks."""
+        chunk.to_csv(self.tmp_path, mode="a", header=self._header, index=False)
+        self._header = False
+        self.rows += len(chunk)
+        return chunk
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+            return
+        if self._header:
+            # No chunk was written: keep an empty file rather than none
+            open(self.tmp_path, "w").close()
+        os.replace(self.tmp_path, self.path)
@@ -0,0 +1,135 @@
+"""
+Dense country x year x subfield cube of publication and citation counts.
+
+The subfield counts of 2_0 are pivoted once into NumPy arrays indexed by
+(country, year, subfield), so every indicator is a broadcast over the cube instead of
+a groupby and merge per call. Indicators are computed on first use and cached.
+
+"World" totals are the totals over the countries in the cube (all COUNTRY_CODES when
+2_0 ran for all of them), not over every country in OpenAlex.
+"""
+
+from functools import cached_property
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+DIMENSIONS = ("country_code", "publication_year", "subfield_display_name")
+LAYERS = ("count", "citation_count")
+
+
+def safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Elementwise division with NaN where the denominator is 0."""
+    numerator, denominator = np.broadcast_arrays(
+        np.asarray(numerator, dtype=np.float64), np.asarray(denominator, dtype=np.float64)
+    )
+    out = np.full(numerator.shape, np.nan)
+    np.divide(numerator, denominator, out=out, where=denominator != 0)
+    return out
+
+
+class CountCube:
+    """
+    Parameters:
+        counts: rows with the DIMENSIONS columns and the LAYERS columns, as written by
+            2_0; repeated cells are summed and missing cells count as 0. citation_count
+            is optional, as 2_0 only asks for it when it is in its METRICS.
+    """
+
+    def __init__(self, counts: pd.DataFrame):
+        counts = counts.assign(publication_year=counts["publication_year"].astype(int))
+        self.axes = {
+            dimension: pd.Index(sorted(counts[dimension].unique()), name=dimension)
+            for dimension in DIMENSIONS
+        }
+        shape = tuple(len(self.axes[dimension]) for dimension in DIMENSIONS)
+        index = tuple(
+            self.axes[dimension].get_indexer(counts[dimension]) for dimension in DIMENSIONS
+        )
+        self.layers: Dict[str, np.ndarray] = {}
+        for layer in LAYERS:
+            if layer != "count" and layer not in counts:
+                continue
+            cube = np.zeros(shape, dtype=np.int64)
+            np.add.at(cube, index, counts[layer].fillna(0).to_numpy(np.int64))
+            self.layers[layer] = cube
+
+    @property
+    def count(self) -> np.ndarray:
+        return self.layers["count"]
+
+    @property
+    def citation_count(self) -> Optional[np.ndarray]:
+        """None if the counts had no citation_count column."""
+        return self.layers.get("citation_count")
+
+    def cell_index(self, df: pd.DataFrame):
+        """Cube indices of the cells of df's rows, for gathering indicators per row."""
+        return tuple(
+            self.axes[dimension].get_indexer(
+                df[dimension].astype(int) if dimension == "publication_year" else df[dimension]
+            )
+            for dimension in DIMENSIONS
+        )
+
+    @cached_property
+    def country_year_total(self) -> np.ndarray:
+        """Publications of each country and year over all subfields, shape (C, Y, 1)."""
+        return self.count.sum(axis=2, keepdims=True)
+
+    @cached_property
+    def percentage(self) -> np.ndarray:
+        """Share (%) of each subfield in its country's publications of the year."""
+        return safe_divide(self.count, self.country_year_total) * 100
+
+    @cached_property
+    def world_share(self) -> np.ndarray:
+        """Share (%) of each country in the cube's publications of a subfield and year."""
+        return safe_divide(self.count, self.count.sum(axis=0, keepdims=True)) * 100
+
+    @cached_property
+    def activity_index(self) -> np.ndarray:
+        """
+        Revealed comparative advantage (activity index): a country's share of a subfield
+        divided by the subfield's share of all publications, per year. Above 1 means the
+        country is specialized in the subfield.
+        """
+        world_subfield_share = safe_divide(
+            self.count.sum(axis=0, keepdims=True),
+            self.count.sum(axis=(0, 2), keepdims=True),
+        )
+        return safe_divide(self.percentage / 100, world_subfield_share)
+
+    @cached_property
+    def citations_per_paper(self) -> Optional[np.ndarray]:
+        """None without citation counts."""
+        if self.citation_count is None:
+            return None
+        return safe_divide(self.citation_count, self.count)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        All cells in long format, with the counts and every indicator; the citation
+        columns are left out without citation counts.
+        """
+        index = pd.MultiIndex.from_product(
+            [self.axes[dimension] for dimension in DIMENSIONS], names=DIMENSIONS
+        )
+        columns = {
+            "count": self.count,
+            "citation_count": self.citation_count,
+            "total": np.broadcast_to(self.country_year_total, self.count.shape),
+            "percentage": self.percentage,
+            "world_share": self.world_share,
+            "activity_index": self.activity_index,
+            "citations_per_paper": self.citations_per_paper,
+        }
+        return pd.DataFrame(
+            {
+                name: values.ravel()
+                for name, values in columns.items()
+                if values is not None
+            },
+            index=index,
+        ).reset_index()
@@ -0,0 +1,57 @@
+"""
+Cross-slice work deduplication for metadata harvests.
+
+A work co-authored by several countries is returned by every country's query. The
+registry remembers which work ids are already stored so each work is fetched and
+written once; every slice still records the ids its query returned in a membership
+table, so per-country datasets can be rebuilt from the deduplicated store.
+"""
+
+import threading
+from typing import Collection, Iterable, List, Tuple
+
+from utils.checkpoint import load_checkpoints, read_committed_ids
+
+
+class WorkRegistry:
+    """Thread-safe set of work ids already stored by some slice."""
+
+    def __init__(self, ids: Iterable[str] = ()):
+        self._ids = set(ids)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def claim(self, ids: Iterable[str]) -> List[str]:
+        """
+        Marks ids as stored and returns those that were not stored before,
+        in input order. Each id is handed out to exactly one caller.
+        """
+        claimed = []
+        with self._lock:
+            for work_id in ids:
+                if work_id not in self._ids:
+                    self._ids.add(work_id)
+                    claimed.append(work_id)
+        return claimed
+
+    def unclaimed(self, ids: Iterable[str]) -> List[str]:
+        """The ids not stored yet, in input order, without claiming them."""
+        with self._lock:
+            return [work_id for work_id in ids if work_id not in self._ids]
+
+    @classmethod
+    def from_checkpoints(
+        cls, checkpoint_dir: str, exclude: Collection[Tuple[str, str]] = ()
+    ) -> "WorkRegistry":
+        """
+        Seeds the registry with the works committed by earlier runs, except those of
+        the (country, year) slices in `exclude`, which are about to be rebuilt.
+        """
+        registry = cls()
+        for state in load_checkpoints(checkpoint_dir):
+            if (state["country"], state["year"]) in exclude:
+                continue
+            registry.claim(read_committed_ids(state["output_file"], state["rows"]))
+        return registry
@@ -0,0 +1,156 @@
+"""
+Compact binary format for the collaboration networks.
+
+GEXF is XML: reading it back with `nx.read_gexf` parses every node and edge into
+networkx dicts. A binary graph is a directory instead, `<name>.graph/`, holding
+
+    nodes.parquet   node table: id plus one column per node attribute (label1, ...)
+    src.npy         int32 edge list: index of the first node in the node table
+    dst.npy         int32 edge list: index of the second node
+    weight.npy      edge weights
+    meta.json       number of nodes and edges
+
+The edge arrays are memory-mapped when loaded, so readers work on them without
+copying, and GEXF is only written as an export for Gephi.
+"""
+
+import json
+import os
+from typing import List, NamedTuple
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from utils.gexf_writer import write_gexf
+
+GRAPH_SUFFIX = ".graph"
+
+
+class GraphArrays(NamedTuple):
+    """An undirected weighted graph as a node table and edge arrays."""
+
+    nodes: pd.DataFrame
+    src: np.ndarray
+    dst: np.ndarray
+    weight: np.ndarray
+
+
+def graph_name(subfield: str, year=None) -> str:
+    """File name (without suffix) of a subfield graph, as written by 3_2 and 4_0."""
+    name = subfield.replace(" ", "_")
+    return name if year is None else f"{name}_{year}"
+
+
+def graph_exists(path: str) -> bool:
+    return os.path.exists(os.path.join(path, "meta.json"))
+
+
+def from_networkx(G: nx.Graph) -> GraphArrays:
+    ids = list(G.nodes)
+    if not ids:
+        # from_records cannot build a frame without rows or columns
+        return GraphArrays(
+            pd.DataFrame({"id": pd.Series(dtype=object)}),
+            np.empty(0, np.int32),
+            np.empty(0, np.int32),
+            np.empty(0, np.int64),
+        )
+    nodes = pd.DataFrame.from_records(
+        [attributes for _, attributes in G.nodes(data=True)], index=range(len(ids))
+    )
+    nodes.insert(0, "id", [str(node) for node in ids])
+
+    index = {node: i for i, node in enumerate(ids)}
+    edges = list(G.edges(data="weight", default=1))
+    src = np.fromiter((index[u] for u, _, _ in edges), dtype=np.int32, count=len(edges))
+    dst = np.fromiter((index[v] for _, v, _ in edges), dtype=np.int32, count=len(edges))
+    weight = np.array([w for _, _, w in edges])
+    if weight.dtype.kind not in "iuf":
+        weight = weight.astype(np.float64)
+    return GraphArrays(nodes, src, dst, weight)
+
+
+def to_networkx(graph: GraphArrays) -> nx.Graph:
+    """Builds a networkx graph; missing node attributes are left out."""
+    G = nx.Graph()
+    for record in graph.nodes.to_dict("records"):
+        node = record.pop("id")
+        G.add_node(node, **{k: v for k, v in record.items() if not pd.isna(v)})
+
+    ids = graph.nodes["id"].to_numpy()
+    G.add_weighted_edges_from(
+        zip(ids[graph.src].tolist(), ids[graph.dst].tolist(), graph.weight.tolist())
+    )
+    return G
+
+
+def write_graph(graph: GraphArrays, path: str) -> None:
+    os.makedirs(path, exist_ok=True)
+    graph.nodes.to_parquet(os.path.join(path, "nodes.parquet"), index=False)
+    np.save(os.path.join(path, "src.npy"), np.asarray(graph.src, dtype=np.int32))
+    np.save(os.path.join(path, "dst.npy"), np.asarray(graph.dst, dtype=np.int32))
+    np.save(os.path.join(path, "weight.npy"), np.asarray(graph.weight))
+    # Written last: a graph without meta.json is incomplete
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump({"nodes": len(graph.nodes), "edges": int(len(graph.src))}, f)
+
+
+def read_graph(path: str, mmap: bool = True) -> GraphArrays:
+    """Loads a binary graph, memory-mapping the edge arrays unless `mmap` is False."""
+    mmap_mode = "r" if mmap else None
+    nodes = pq.read_table(os.path.join(path, "nodes.parquet"), memory_map=mmap).to_pandas()
+    return GraphArrays(
+        nodes,
+        np.load(os.path.join(path, "src.npy"), mmap_mode=mmap_mode),
+        np.load(os.path.join(path, "dst.npy"), mmap_mode=mmap_mode),
+        np.load(os.path.join(path, "weight.npy"), mmap_mode=mmap_mode),
+    )
+
+
+def compose_graphs(graphs: List[GraphArrays]) -> GraphArrays:
+    """
+    Combines graphs like repeated `nx.compose`: nodes and edges keep the order in which
+    they first appear, and later graphs take precedence for node attributes and edge
+    weights.
+    """
+    graphs = [graph for graph in graphs if len(graph.nodes)]
+    if not graphs:
+        return GraphArrays(
+            pd.DataFrame(columns=["id"]),
+            np.empty(0, np.int32),
+            np.empty(0, np.int32),
+            np.empty(0, np.int64),
+        )
+
+    # Last non-missing value of every attribute, in order of first appearance
+    nodes = (
+        pd.concat([graph.nodes for graph in graphs], ignore_index=True)
+        .groupby("id", sort=False)
+        .last()
+        .reset_index()
+    )
+    node_index = pd.Index(nodes["id"])
+
+    ends, weights = [], []
+    for graph in graphs:
+        local = node_index.get_indexer(graph.nodes["id"])
+        src, dst = local[graph.src], local[graph.dst]
+        ends.append(np.stack([np.minimum(src, dst), np.maximum(src, dst)], axis=1))
+        weights.append(np.asarray(graph.weight))
+    edges = pd.DataFrame(np.concatenate(ends), columns=["src", "dst"])
+    edges["weight"] = np.concatenate(weights)
+    edges = edges.groupby(["src", "dst"], sort=False).last().reset_index()
+
+    return GraphArrays(
+        nodes,
+        edges["src"].to_numpy(np.int32),
+        edges["dst"].to_numpy(np.int32),
+        edges["weight"].to_numpy(),
+    )
+
+
+def export_gexf(path: str, gexf_path: str) -> None:
+    """Writes a binary graph as GEXF (gzip-compressed for .gz paths), e.g. for Gephi."""
+    write_gexf(read_graph(path), gexf_path)
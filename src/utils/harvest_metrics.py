@@ -0,0 +1,209 @@
+"""
+Instrumentation for OpenAlex harvests.
+
+HarvestMetrics collects request latencies (as a histogram), bytes received, HTTP
+statuses, retries, cache hits and harvest progress. A run writes the summary as JSON,
+and can optionally expose the same metrics in Prometheus text format on a local port
+while it is running.
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+# Upper bounds in seconds of the request latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+
+
+def bucket_label(bound: Optional[float]):
+    """Prometheus-style label of a bucket bound ("+Inf" for the last bucket)."""
+    return "+Inf" if bound == float("inf") else bound
+
+
+class HarvestMetrics:
+    """
+    Thread-safe metrics of one harvest run.
+
+    Parameters:
+        stage: name of the pipeline stage, used in the summary and metric labels.
+        unit: what the progress counters count (e.g. "works" or "queries").
+    """
+
+    def __init__(self, stage: str, unit: str = "works"):
+        self.stage = stage
+        self.unit = unit
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.bytes_received = 0
+        self.status_counts: Dict[int, int] = {}
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+        self.done = 0
+        self.expected = 0
+        self._server = None
+
+    def record_request(self, latency: float, num_bytes: int, status: Optional[int]) -> None:
+        """Records one HTTP attempt; `status` is None when no response was received."""
+        with self._lock:
+            self.requests += 1
+            self.bytes_received += num_bytes
+            self.latency_sum += latency
+            self.latency_buckets[bisect_left(LATENCY_BUCKETS, latency)] += 1
+            if status is None:
+                self.errors += 1
+            else:
+                self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    def record_retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def record_cache_hit(self) -> None:
+        with self._lock:
+            self.cache_hits += 1
+
+    def add_expected(self, count: int) -> None:
+        """Adds to the total number of items the run is expected to fetch."""
+        with self._lock:
+            self.expected += count
+
+    def add_done(self, count: int) -> None:
+        with self._lock:
+            self.done += count
+
+    def eta_seconds(self) -> Optional[float]:
+        """Estimated seconds left at the current rate, or None before any progress."""
+        elapsed = time.time() - self.started_at
+        if self.done == 0 or elapsed == 0:
+            return None
+        return max(self.expected - self.done, 0) / (self.done / elapsed)
+
+    def latency_quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the histogram bucket holding the q-quantile latency."""
+        total = sum(self.latency_buckets)
+        if total == 0:
+            return None
+        threshold = q * total
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets):
+            cumulative += count
+            if cumulative >= threshold:
+                return bound
+        return LATENCY_BUCKETS[-1]
+
+    def summary(self) -> Dict:
+        """Returns all metrics as a JSON-serializable dict."""
+        with self._lock:
+            elapsed = time.time() - self.started_at
+            return {
+                "stage": self.stage,
+                "started_at": self.started_at,
+                "elapsed_seconds": round(elapsed, 3),
+                "requests": self.requests,
+                "requests_per_second": round(self.requests / elapsed, 3) if elapsed else 0,
+                "retries": self.retries,
+                "throttled_429": self.status_counts.get(429, 0),
+                "connection_errors": self.errors,
+                "cache_hits": self.cache_hits,
+                "status_counts": {str(k): v for k, v in sorted(self.status_counts.items())},
+                "bytes_received": self.bytes_received,
+                "latency_seconds": {
+                    "sum": round(self.latency_sum, 3),
+                    "mean": round(self.latency_sum / self.requests, 3) if self.requests else None,
+                    "p50_le": bucket_label(self.latency_quantile(0.5)),
+                    "p90_le": bucket_label(self.latency_quantile(0.9)),
+                    "p99_le": bucket_label(self.latency_quantile(0.99)),
+                    "buckets": {
+                        str(bucket_label(bound)): count
+                        for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets)
+                    },
+                },
+                self.unit: self.done,
+                f"expected_{self.unit}": self.expected,
+                f"{self.unit}_per_second": round(self.done / elapsed, 3) if elapsed else 0,
+                "eta_seconds": self.eta_seconds(),
+            }
+
+    def write_json(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def to_prometheus(self) -> str:
+        """Renders the metrics in the Prometheus text exposition format."""
+        label = f'stage="{self.stage}"'
+        with self._lock:
+            lines = [
+                "# TYPE openalex_requests_total counter",
+                f"openalex_requests_total{{{label}}} {self.requests}",
+                "# TYPE openalex_retries_total counter",
+                f"openalex_retries_total{{{label}}} {self.retries}",
+                "# TYPE openalex_cache_hits_total counter",
+                f"openalex_cache_hits_total{{{label}}} {self.cache_hits}",
+                "# TYPE openalex_connection_errors_total counter",
+                f"openalex_connection_errors_total{{{label}}} {self.errors}",
+                "# TYPE openalex_bytes_received_total counter",
+                f"openalex_bytes_received_total{{{label}}} {self.bytes_received}",
+                "# TYPE openalex_responses_total counter",
+            ]
+            lines += [
+                f'openalex_responses_total{{{label},status="{status}"}} {count}'
+                for status, count in sorted(self.status_counts.items())
+            ]
+            lines.append("# TYPE openalex_request_latency_seconds histogram")
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets):
+                cumulative += count
+                lines.append(
+                    f'openalex_request_latency_seconds_bucket{{{label},le="{bucket_label(bound)}"}} {cumulative}'
+                )
+            lines += [
+                f"openalex_request_latency_seconds_sum{{{label}}} {self.latency_sum}",
+                f"openalex_request_latency_seconds_count{{{label}}} {self.requests}",
+                "# TYPE openalex_items_done counter",
+                f'openalex_items_done{{{label},unit="{self.unit}"}} {self.done}',
+                "# TYPE openalex_items_expected gauge",
+                f'openalex_items_expected{{{label},unit="{self.unit}"}} {self.expected}',
+            ]
+        eta = self.eta_seconds()
+        if eta is not None:
+            lines += ["# TYPE openalex_eta_seconds gauge", f"openalex_eta_seconds{{{label}}} {eta}"]
+        return "\n".join(lines) + "\n"
+
+    def serve_prometheus(self, port: int, host: str = "127.0.0.1") -> None:
+        """Serves the metrics at http://host:port/metrics from a background thread."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,121 @@
+"""
+Persistent on-disk cache for OpenAlex API responses.
+
+Responses are stored in a local SQLite database keyed by the normalized request
+(URL plus sorted query parameters, without the `mailto` contact address). Entries
+expire after a TTL, and the least recently used entries are evicted once the cache
+holds more than `max_entries` responses.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlencode
+
+# Parameters that identify the caller rather than the query
+IGNORED_PARAMS = {"mailto", "api_key"}
+
+
+class CacheMissError(LookupError):
+    """Raised in offline mode when a request is not in the cache."""
+
+
+def normalize_request(url: str, params: Optional[Dict] = None) -> str:
+    """Returns a canonical string for a request, independent of parameter order."""
+    items = sorted(
+        (str(key), str(value))
+        for key, value in (params or {}).items()
+        if key not in IGNORED_PARAMS
+    )
+    return f"{url.rstrip('/')}?{urlencode(items)}"
+
+
+class ResponseCache:
+    """
+    SQLite-backed response cache with TTL expiry and LRU eviction.
+
+    Parameters:
+        path: SQLite database file; parent directories are created if needed.
+        ttl_seconds: age after which a cached response is ignored (None: never expires).
+        max_entries: maximum number of responses kept; least recently used go first.
+    """
+
+    def __init__(
+        self, path: str, ttl_seconds: Optional[float] = None, max_entries: int = 100_000
+    ):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                request TEXT NOT NULL,
+                body TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_accessed_at ON responses (accessed_at)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _key(request: str) -> str:
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def get(self, url: str, params: Optional[Dict] = None) -> Optional[Dict]:
+        """Returns the cached response for a request, or None if missing or expired."""
+        key = self._key(normalize_request(url, params))
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            body, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+        return json.loads(body)
+
+    def set(self, url: str, params: Optional[Dict], data: Dict) -> None:
+        """Stores a response, evicting the least recently used entries if needed."""
+        request = normalize_request(url, params)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (self._key(request), request, json.dumps(data), now, now),
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    """
+                    DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?
+                    )
+                    """,
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,76 @@
+"""
+Persistent dictionary of dense integer codes for OpenAlex IDs.
+
+Author, institution, work and subfield IDs (e.g. "A5012345678") are interned once into
+int32 codes numbered from 0 in order of first appearance, so tables and graph builders
+can key dicts and arrays by small integers instead of strings. Codes stay stable when
+the dictionary is saved and loaded again, new IDs get the next free codes, and the
+original IDs are restored with `decode` when results are exported.
+"""
+
+import os
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+KINDS = ("works", "authors", "institutions", "subfields")
+
+# Code of missing IDs (None or NaN)
+MISSING = -1
+
+
+class IdDictionary:
+    """
+    Maps the IDs of every kind in KINDS to dense int32 codes.
+
+    Parameters:
+        ids: for each kind, the IDs ordered by code.
+    """
+
+    def __init__(self, ids: Optional[Dict[str, List[str]]] = None):
+        self._ids = {kind: list((ids or {}).get(kind, [])) for kind in KINDS}
+        self._codes = {
+            kind: {id_: code for code, id_ in enumerate(self._ids[kind])} for kind in KINDS
+        }
+
+    @classmethod
+    def load(cls, directory: str) -> "IdDictionary":
+        """Loads a saved dictionary; kinds without a file start empty."""
+        ids = {}
+        for kind in KINDS:
+            path = os.path.join(directory, f"{kind}.parquet")
+            if os.path.exists(path):
+                ids[kind] = pq.read_table(path).column("id").to_pylist()
+        return cls(ids)
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        for kind in KINDS:
+            table = pa.table({"id": pa.array(self._ids[kind], pa.string())})
+            pq.write_table(table, os.path.join(directory, f"{kind}.parquet"))
+
+    def size(self, kind: str) -> int:
+        return len(self._ids[kind])
+
+    def encode(self, kind: str, ids: Iterable) -> np.ndarray:
+        """Returns the codes of `ids`, assigning new codes to unseen IDs."""
+        codes, known = self._codes[kind], self._ids[kind]
+        encoded = []
+        for id_ in ids:
+            if id_ is None or (isinstance(id_, float) and np.isnan(id_)):
+                encoded.append(MISSING)
+                continue
+            code = codes.get(id_)
+            if code is None:
+                code = codes[id_] = len(known)
+                known.append(id_)
+            encoded.append(code)
+        return np.array(encoded, dtype=np.int32)
+
+    def decode(self, kind: str, codes: Iterable[int]) -> List[Optional[str]]:
+        """Returns the original IDs of `codes` (None for MISSING)."""
+        known = self._ids[kind]
+        return [None if code == MISSING else known[code] for code in codes]
+
@@ -0,0 +1,114 @@
+"""
+Handling of hyper-authored works in the co-authorship networks.
+
+A work with k authors adds k(k-1)/2 edges, so a few consortium papers with hundreds of
+authors dominate both the build time and the size of the graphs, and each of their
+pairs weighs as much as the pair of a two-author paper. A TeamPolicy changes this:
+
+    weighting="fractional"  every pair of a work weighs 1/(k-1) (Newman's weighting), so
+                            each author's collaboration strength per work sums to 1
+    max_team_size=n         works with more than n authors are either represented as a
+                            star (large_teams="star": the first author linked to each
+                            co-author, k-1 pairs) or skipped (large_teams="skip")
+
+The default policy keeps every pair with weight 1, as the builders always did.
+A LargeTeamReport counts the pairs a policy avoided, so the cost of a build can be
+bounded by the number of works instead of by the largest team.
+"""
+
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+WEIGHTINGS = ("count", "fractional")
+LARGE_TEAMS = ("star", "skip")
+
+
+class TeamPolicy(NamedTuple):
+    weighting: str = "count"
+    # None: no team is large
+    max_team_size: Optional[int] = None
+    large_teams: str = "star"
+
+    def check(self) -> "TeamPolicy":
+        """Returns the policy, raising ValueError if it is not valid."""
+        if self.weighting not in WEIGHTINGS:
+            raise ValueError(f"Unknown weighting {self.weighting!r}, expected one of {WEIGHTINGS}")
+        if self.large_teams not in LARGE_TEAMS:
+            raise ValueError(f"Unknown large_teams {self.large_teams!r}, expected one of {LARGE_TEAMS}")
+        if self.max_team_size is not None and self.max_team_size < 2:
+            raise ValueError("max_team_size must be at least 2")
+        return self
+
+
+def is_large(team_size, policy: TeamPolicy):
+    """Whether works of `team_size` authors (int or array) are large under the policy."""
+    if policy.max_team_size is None:
+        return np.zeros_like(team_size, dtype=bool)
+    return np.asarray(team_size) > policy.max_team_size
+
+
+def pair_weight(team_size, policy: TeamPolicy):
+    """Weight of every pair of a work of `team_size` authors (int or array)."""
+    team_size = np.asarray(team_size)
+    if policy.weighting == "fractional":
+        return 1 / np.maximum(team_size - 1, 1)
+    return np.ones_like(team_size, dtype=np.int64)
+
+
+def built_pairs(team_size, policy: TeamPolicy):
+    """Number of pairs the policy adds for works of `team_size` authors (int or array)."""
+    team_size = np.asarray(team_size, dtype=np.int64)
+    all_pairs = team_size * (team_size - 1) // 2
+    if policy.max_team_size is None:
+        return all_pairs
+    large_pairs = np.maximum(team_size - 1, 0) if policy.large_teams == "star" else 0
+    return np.where(is_large(team_size, policy), large_pairs, all_pairs)
+
+
+class LargeTeamReport:
+    """Counts the works, large works and co-author pairs of builds under a TeamPolicy."""
+
+    def __init__(self, policy: TeamPolicy):
+        self.policy = policy
+        self.works = 0
+        self.large_works = 0
+        self.largest_team = 0
+        self.all_pairs = 0
+        self.pairs = 0
+
+    def add(self, team_sizes) -> None:
+        """Records works of the given numbers of authors (int or array)."""
+        team_sizes = np.atleast_1d(np.asarray(team_sizes, dtype=np.int64))
+        if not len(team_sizes):
+            return
+        self.works += len(team_sizes)
+        self.large_works += int(np.count_nonzero(is_large(team_sizes, self.policy)))
+        self.largest_team = max(self.largest_team, int(team_sizes.max()))
+        self.all_pairs += int((team_sizes * (team_sizes - 1) // 2).sum())
+        self.pairs += int(np.sum(built_pairs(team_sizes, self.policy)))
+
+    @property
+    def pairs_avoided(self) -> int:
+        return self.all_pairs - self.pairs
+
+    def summary(self) -> dict:
+        return {
+            **self.policy._asdict(),
+            "works": self.works,
+            "large_works": self.large_works,
+            "largest_team": self.largest_team,
+            "all_pairs": self.all_pairs,
+            "pairs": self.pairs,
+            "pairs_avoided": self.pairs_avoided,
+        }
+
+    def __str__(self) -> str:
+        large = ""
+        if self.policy.max_team_size is not None:
+            large = f", {self.large_works} with more than {self.policy.max_team_size} authors"
+        return (
+            f"{self.works} works{large} (largest team: {self.largest_team}); "
+            f"{self.pairs} of {self.all_pairs} co-author pairs built, "
+            f"{self.pairs_avoided} avoided"
+        )
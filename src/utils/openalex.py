@@ -0,0 +1,252 @@
+"""
+Shared OpenAlex client used by the harvest scripts.
+
+All requests go through a single pooled keep-alive session. A token bucket keeps the
+request rate under a configurable budget, and a thread pool keeps several requests in
+flight, so throughput reaches the polite-pool limit instead of idling on fixed sleeps.
+Responses with status 429 or 5xx are retried with exponential backoff. An optional
+ResponseCache serves repeated queries from disk, and offline mode answers from the cache
+only.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.harvest_metrics import HarvestMetrics
+from utils.http_cache import CacheMissError, ResponseCache
+
+WORKS_URL = "https://api.openalex.org/works"
+
+# OpenAlex polite pool allows up to 10 requests per second
+DEFAULT_REQUESTS_PER_SECOND = 10.0
+DEFAULT_MAX_IN_FLIGHT = 8
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_FACTOR = 1.0
+DEFAULT_TIMEOUT = 60
+
+# Largest page size accepted by OpenAlex
+MAX_PER_PAGE = 200
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Shown instead of the API key in messages and log lines
+REDACTED = "<redacted>"
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting how many requests start per second.
+    Up to `capacity` requests may start back to back; after that, requests are
+    spaced out at `rate` per second.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Blocks until a token is available and consumes it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._last) * self.rate
+                )
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class OpenAlexClient:
+    """
+    Rate-limited, retrying client for the OpenAlex REST API.
+
+    Parameters:
+        email: address sent as `mailto` so requests join the polite pool.
+        api_key: optional premium API key, needed e.g. for `from_updated_date` filters.
+        requests_per_second: global request budget shared by every thread.
+        max_in_flight: number of requests kept in flight by `get_many`.
+        max_retries: retries for connection errors and 429/5xx responses.
+        backoff_factor: base delay in seconds, doubled after every retry.
+        cache: optional on-disk cache consulted before sending a request.
+        offline: answer from the cache only; a miss raises CacheMissError.
+        metrics: optional collector of latency, bytes, status and retry metrics.
+    """
+
+    def __init__(
+        self,
+        email: Optional[str] = None,
+        api_key: Optional[str] = None,
+        requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+        timeout: float = DEFAULT_TIMEOUT,
+        cache: Optional[ResponseCache] = None,
+        offline: bool = False,
+        metrics: Optional[HarvestMetrics] = None,
+        logger: Optional[logging.Logger] = None,
+    ):
+        if offline and cache is None:
+            raise ValueError("offline mode requires a cache")
+        self.email = email
+        self.api_key = api_key
+        self.cache = cache
+        self.offline = offline
+        self.metrics = metrics
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.logger = logger or logging.getLogger(__name__)
+        self.bucket = TokenBucket(requests_per_second)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _prepare_params(self, params: Optional[Dict]) -> Dict:
+        params = dict(params or {})
+        if self.email and "mailto" not in params:
+            params["mailto"] = self.email
+        if self.api_key and "api_key" not in params:
+            params["api_key"] = self.api_key
+        return params
+
+    def _redact(self, text: str) -> str:
+        """`text` with the API key masked, e.g. a URL or params in a message."""
+        return text.replace(self.api_key, REDACTED) if self.api_key else text
+
+    def _redact_error(self, error: Exception) -> Exception:
+        """
+        Masks the API key in the message of a requests exception, whose URL carries it,
+        and drops the chained urllib3 exceptions, whose messages carry it too.
+        """
+        error.args = tuple(self._redact(str(arg)) for arg in error.args)
+        error.__cause__ = None
+        error.__suppress_context__ = True
+        return error
+
+    def _retry_delay(self, attempt: int, response: Optional[requests.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return float(retry_after)
+                except ValueError:
+                    pass
+        return self.backoff_factor * (2**attempt)
+
+    def get(
+        self, params: Optional[Dict] = None, url: str = WORKS_URL, use_cache: bool = True
+    ) -> Dict:
+        """
+        Sends a GET request and returns the decoded JSON body.
+        Retries on connection errors and on 429/5xx responses; any other HTTP error,
+        or running out of retries, raises a requests exception.
+        With a cache, a fresh cached response is returned without a request.
+        """
+        params = self._prepare_params(params)
+        use_cache = use_cache and self.cache is not None
+        if use_cache:
+            data = self.cache.get(url, params)
+            if data is not None:
+                if self.metrics is not None:
+                    self.metrics.record_cache_hit()
+                return data
+            if self.offline:
+                raise CacheMissError(self._redact(f"Not cached in offline mode: {url} {params}"))
+
+        data = self._fetch(params, url)
+        if use_cache:
+            self.cache.set(url, params, data)
+        return data
+
+    def _fetch(self, params: Dict, url: str) -> Dict:
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            response = None
+            start = time.monotonic()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                if self.metrics is not None:
+                    self.metrics.record_request(
+                        time.monotonic() - start, len(response.content), response.status_code
+                    )
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    return response.json()
+                error = requests.exceptions.HTTPError(
+                    self._redact(f"{response.status_code} error for {response.url}"),
+                    response=response,
+                )
+            except requests.exceptions.HTTPError as e:
+                raise self._redact_error(e) from None
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if self.metrics is not None:
+                    self.metrics.record_request(time.monotonic() - start, 0, None)
+                error = self._redact_error(e)
+
+            if attempt == self.max_retries:
+                raise error
+            if self.metrics is not None:
+                self.metrics.record_retry()
+            delay = self._retry_delay(attempt, response)
+            self.logger.warning(
+                f"Request failed ({error}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s"
+            )
+            time.sleep(delay)
+
+    def get_many(self, params_list: Iterable[Dict], url: str = WORKS_URL) -> List:
+        """
+        Runs `get` for every set of parameters with up to `max_in_flight` requests in
+        flight. Returns the responses in input order; a failed request yields the
+        exception instance in its place so one bad cell does not discard the rest.
+        """
+
+        def safe_get(params):
+            try:
+                return self.get(params, url=url)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            return list(executor.map(safe_get, params_list))
+
+    def iter_cursor_pages(
+        self, params: Dict, cursor: str = "*", url: str = WORKS_URL
+    ) -> Iterator[Dict]:
+        """
+        Walks a result set with cursor paging and yields each response as it arrives.
+        Unlike page-based paging, cursor paging is not capped at 10k results. Each
+        response's `meta.next_cursor` is the cursor of the following page; iteration
+        stops when it is empty or a page comes back without results.
+        Cursor pages are never cached, as cursors are only valid for a short time.
+        """
+        params = {key: value for key, value in params.items() if key != "page"}
+        while cursor:
+            data = self.get({**params, "cursor": cursor}, url=url, use_cache=False)
+            if not data.get("results"):
+                return
+            yield data
+            cursor = data.get("meta", {}).get("next_cursor")
+
+    def close(self) -> None:
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
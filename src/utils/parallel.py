@@ -0,0 +1,51 @@
+"""
+Process-pool execution of independent pipeline shards (e.g. one subfield's graphs).
+
+Shards are described by small picklable keys such as a subfield name: each worker
+reads its own inputs (store partitions, graph files) and writes its own outputs, and
+only returns a small summary, so no DataFrame or graph is pickled between processes.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Hashable, Iterable, Optional
+
+
+def default_workers() -> int:
+    """Cores available to this process."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def run_sharded(
+    function: Callable, shards: Iterable[Hashable], workers: Optional[int] = None
+) -> Dict[Hashable, object]:
+    """
+    Calls `function(shard)` for every shard, on a pool of `workers` processes (all
+    cores if None), or in this process if workers is 1. `function` must be defined at
+    module level. Exceptions of a shard are raised once the other shards are done.
+
+    Returns:
+        dict: shard -> result of function(shard), in the order of `shards`.
+    """
+    shards = list(shards)
+    workers = default_workers() if workers is None else workers
+    workers = max(1, min(workers, len(shards)))
+    if workers == 1:
+        return {shard: function(shard) for shard in shards}
+
+    results, errors = {}, {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(function, shard): shard for shard in shards}
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                results[shard] = future.result()
+            except Exception as e:
+                errors[shard] = e
+    if errors:
+        shard, error = next(iter(errors.items()))
+        raise RuntimeError(f"{len(errors)} of {len(shards)} shards failed, e.g. {shard!r}") from error
+    return {shard: results[shard] for shard in shards}
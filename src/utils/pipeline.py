@@ -0,0 +1,236 @@
+"""
+Incremental runner for the numbered pipeline scripts.
+
+Every stage declares the script it runs, the stages it depends on, and the files it
+reads and writes (glob patterns; directories stand for all files below them). A stage
+is skipped when the content hash of its script, of the shared utils package and of its
+input files matches the hash recorded at its last successful run and its outputs still
+exist. Stages whose dependencies are done run concurrently, except stages that share a
+`resource` (e.g. the OpenAlex request budget), which run one at a time.
+"""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from utils.checkpoint import write_json_atomic
+
+# Read in blocks so large inputs are hashed with constant memory
+HASH_BLOCK_SIZE = 1 << 20
+
+
+class Stage(NamedTuple):
+    name: str
+    script: str
+    inputs: Sequence[str] = ()
+    outputs: Sequence[str] = ()
+    depends_on: Sequence[str] = ()
+    # Stages with the same resource never run at the same time
+    resource: Optional[str] = None
+
+
+def expand(patterns: Iterable[str]) -> List[str]:
+    """Files matched by glob patterns, with directories expanded recursively."""
+    files = set()
+    for pattern in patterns:
+        for path in glob.glob(pattern):
+            if os.path.isdir(path):
+                for root, _, names in os.walk(path):
+                    files.update(os.path.join(root, name) for name in names)
+            else:
+                files.add(path)
+    return sorted(files)
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_hash(paths: Iterable[str]) -> str:
+    """Hash of the names and contents of the given files."""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.normpath(path).encode("utf-8"))
+        digest.update(file_digest(path).encode("ascii"))
+    return digest.hexdigest()
+
+
+def check_stages(stages: Sequence[Stage]) -> None:
+    """Raises ValueError for unknown dependencies or a dependency cycle."""
+    names = {stage.name for stage in stages}
+    for stage in stages:
+        unknown = set(stage.depends_on) - names
+        if unknown:
+            raise ValueError(f"Stage {stage.name} depends on unknown stages {sorted(unknown)}")
+
+    remaining = {stage.name: set(stage.depends_on) for stage in stages}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps & remaining.keys()]
+        if not ready:
+            raise ValueError(f"Dependency cycle between stages {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+
+
+class PipelineRunner:
+    """
+    Runs a DAG of stages, skipping the ones whose inputs did not change.
+
+    Parameters:
+        stages: the pipeline stages.
+        workdir: directory the scripts run in; stage paths are relative to it.
+        state_file: JSON file with the input hash of every stage's last successful run.
+        code_paths: glob patterns of code shared by all stages (hashed into every stage).
+        log_dir: directory receiving one log file per stage run.
+        max_workers: stages running at the same time.
+    """
+
+    def __init__(
+        self,
+        stages: Sequence[Stage],
+        workdir: str,
+        state_file: str,
+        code_paths: Sequence[str] = (),
+        log_dir: Optional[str] = None,
+        max_workers: int = 4,
+        logger: Optional[logging.Logger] = None,
+    ):
+        check_stages(stages)
+        self.stages = {stage.name: stage for stage in stages}
+        self.workdir = workdir
+        self.state_file = state_file
+        self.code_paths = code_paths
+        self.log_dir = log_dir
+        self.max_workers = max_workers
+        self.logger = logger or logging.getLogger(__name__)
+        self.state = {}
+        if os.path.exists(state_file):
+            with open(state_file, "r") as f:
+                self.state = json.load(f)
+
+    def _path(self, path: str) -> str:
+        return os.path.join(self.workdir, path)
+
+    def input_hash(self, stage: Stage) -> str:
+        """Hash of the stage's script, the shared code and the stage's input files."""
+        code = expand([self._path(stage.script), *map(self._path, self.code_paths)])
+        return content_hash(code + expand(map(self._path, stage.inputs)))
+
+    def is_up_to_date(self, stage: Stage, input_hash: str) -> bool:
+        recorded = self.state.get(stage.name, {}).get("input_hash")
+        outputs_exist = all(glob.glob(self._path(pattern)) for pattern in stage.outputs)
+        return recorded == input_hash and outputs_exist
+
+    def _run_script(self, stage: Stage) -> None:
+        env = dict(os.environ)
+        # The scripts import the utils package from src/
+        src_dir = os.path.dirname(os.path.abspath(self.workdir))
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [src_dir, env.get("PYTHONPATH")]))
+
+        log = subprocess.DEVNULL
+        if self.log_dir:
+            os.makedirs(self.log_dir, exist_ok=True)
+            log = open(os.path.join(self.log_dir, f"{stage.name}.log"), "w")
+        try:
+            subprocess.run(
+                [sys.executable, stage.script],
+                cwd=self.workdir,
+                env=env,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                check=True,
+            )
+        finally:
+            if log is not subprocess.DEVNULL:
+                log.close()
+
+    def _run_stage(
+        self, stage: Stage, force: bool, dry_run: bool
+    ) -> Tuple[str, Optional[Dict]]:
+        """
+        Runs a stage unless it is up to date. Returns "ran", "skipped" or "would run",
+        and the state entry of the run if it ran. Runs in the worker threads, so the
+        state itself is only updated and written by `run`.
+        """
+        input_hash = self.input_hash(stage)
+        if not force and self.is_up_to_date(stage, input_hash):
+            return "skipped", None
+        if dry_run:
+            return "would run", None
+
+        started = time.time()
+        self.logger.info(f"[{stage.name}] running {stage.script}")
+        self._run_script(stage)
+        return "ran", {
+            "input_hash": input_hash,
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seconds": round(time.time() - started, 1),
+        }
+
+    def run(
+        self,
+        only: Optional[Iterable[str]] = None,
+        force: Iterable[str] = (),
+        dry_run: bool = False,
+    ) -> Dict[str, str]:
+        """
+        Runs the pipeline. `only` limits the run to the given stages (the others are
+        assumed done); stages in `force` run even if up to date.
+
+        Returns:
+            dict: stage name -> "ran", "skipped", "would run", "failed" or "blocked".
+        """
+        selected = set(self.stages if only is None else only)
+        unknown = selected - self.stages.keys()
+        if unknown:
+            raise ValueError(f"Unknown stages {sorted(unknown)}")
+        force = set(force)
+
+        results = {}
+        pending = {name: self.stages[name] for name in self.stages if name in selected}
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                busy = {self.stages[name].resource for name in running.values()} - {None}
+                for name, stage in list(pending.items()):
+                    deps = [dep for dep in stage.depends_on if dep in selected]
+                    if any(results.get(dep) in ("failed", "blocked") for dep in deps):
+                        results[name] = "blocked"
+                        del pending[name]
+                        self.logger.warning(f"[{name}] not run: a dependency failed")
+                    elif all(dep in results for dep in deps) and stage.resource not in busy:
+                        if stage.resource is not None:
+                            busy.add(stage.resource)
+                        future = executor.submit(
+                            self._run_stage, stage, name in force, dry_run
+                        )
+                        running[future] = name
+                        del pending[name]
+
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name], record = future.result()
+                    except Exception as e:
+                        results[name] = "failed"
+                        self.logger.error(f"[{name}] failed: {e}")
+                        continue
+                    if record is not None:
+                        self.state[name] = record
+                        write_json_atomic(self.state_file, self.state)
+                    self.logger.info(f"[{name}] {results[name]}")
+        return results
@@ -0,0 +1,155 @@
+"""
+Institution- and country-level projections of the co-authorship networks.
+
+The author graph already holds the accumulated co-author pairs, so the networks of the
+higher levels are aggregated from its edges instead of from the works again: with A the
+authors x authors edge weights and M the authors x units memberships, the unit network
+is MᵀAM. An author's membership row is the share of their authorships with each unit
+(institution or country), as recorded in the store's `authorships` table, so the weight
+of an author pair is split over the units of both authors and the total weight of a
+level is the total weight of the author graph. Pairs within a unit become self-loops,
+e.g. domestic collaborations on the diagonal of a country matrix.
+
+Memberships are counted from the authorships of the graph's works (`unit_memberships`);
+authorships without an institution (or country) are left out of that level. Unit nodes
+have 'label1' (country; for institutions the country of most of their authorships) and
+'label3' (number of authorships of the graph's authors).
+"""
+
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from utils import mappings
+from utils.author_profiles import UNKNOWN
+from utils.graph_store import GraphArrays
+from utils.id_dictionary import MISSING, IdDictionary
+
+# Level -> authorships column of its units
+LEVELS = {"institutions": "institution_code", "countries": "country"}
+MEMBERSHIP_COLUMNS = ["author_code", "unit", "country", "authorships"]
+
+
+def unit_memberships(
+    authorships: pd.DataFrame, level: str, by: Sequence[str] = ()
+) -> pd.DataFrame:
+    """
+    Number of authorships of every (author, unit) of a level, with the unit's country.
+    `authorships` needs author_code, country and, for institutions, institution_code,
+    plus the `by` columns (e.g. subfield_name and publication_year) to count per group.
+    """
+    column = LEVELS[level]
+    authorships = authorships[authorships["author_code"] != MISSING]
+    if level == "institutions":
+        authorships = authorships[authorships["institution_code"] != MISSING]
+    else:
+        authorships = authorships[authorships["country"].notna()]
+    authorships = authorships.assign(country=authorships["country"].fillna(UNKNOWN))
+
+    keys = list(dict.fromkeys([*by, "author_code", column, "country"]))
+    counts = authorships.groupby(keys, sort=False).size().reset_index(name="authorships")
+    counts["unit"] = counts[column]
+    return counts[[*by, *MEMBERSHIP_COLUMNS]]
+
+
+def combine_memberships(frames: Iterable[pd.DataFrame], by: Sequence[str] = ()) -> pd.DataFrame:
+    """Adds up the memberships of separate chunks or groups of works."""
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return pd.DataFrame(columns=[*by, *MEMBERSHIP_COLUMNS])
+    return (
+        pd.concat(frames, ignore_index=True)
+        .groupby([*by, "author_code", "unit", "country"], sort=False)["authorships"]
+        .sum()
+        .reset_index()
+    )
+
+
+def project_graph(
+    graph: GraphArrays, memberships: pd.DataFrame, ids: IdDictionary, level: str
+) -> GraphArrays:
+    """
+    Projects an author graph onto the units of `memberships` (of `level`). Units are
+    ordered by the first author (in node order) with a share in them.
+    """
+    author_index = pd.Index(graph.nodes["id"])
+    codes = memberships["author_code"].unique()
+    author_ids = pd.Series(ids.decode("authors", codes), index=codes)
+    memberships = memberships.assign(
+        node=author_index.get_indexer(author_ids[memberships["author_code"]].to_numpy())
+    )
+    memberships = memberships[memberships["node"] >= 0].sort_values("node", kind="stable")
+    unit, units = pd.factorize(memberships["unit"])
+
+    node = memberships["node"].to_numpy(np.int64)
+    authorships = memberships["authorships"].to_numpy(np.float64)
+    totals = memberships.groupby("node")["authorships"].transform("sum").to_numpy(np.float64)
+    share = authorships / totals
+    M = sp.csr_matrix((share, (node, unit)), shape=(len(author_index), len(units)))
+    A = sp.csr_matrix(
+        (np.asarray(graph.weight, dtype=np.float64), (graph.src, graph.dst)),
+        shape=(len(author_index), len(author_index)),
+    )
+    P = (M.T @ A @ M).tocoo()
+
+    # Each edge of A is stored once, so (u, v) and (v, u) add up to the unit edge
+    edges = sp.coo_matrix(
+        (P.data, (np.minimum(P.row, P.col), np.maximum(P.row, P.col))),
+        shape=P.shape,
+    ).tocsr().tocoo()
+    nonzero = edges.data != 0
+
+    country = (
+        memberships.groupby(["unit", "country"], sort=False)["authorships"]
+        .sum()
+        .sort_values(ascending=False, kind="stable")
+        .reset_index()
+        .drop_duplicates("unit")
+        .set_index("unit")["country"]
+    )
+    unit_ids = ids.decode("institutions", units) if level == "institutions" else list(units)
+    nodes = pd.DataFrame(
+        {
+            "id": unit_ids,
+            "label1": country.reindex(units).to_numpy(),
+            "label3": np.bincount(unit, weights=authorships, minlength=len(units)).astype(
+                np.int64
+            ),
+        }
+    )
+    return GraphArrays(
+        nodes,
+        edges.row[nonzero].astype(np.int32),
+        edges.col[nonzero].astype(np.int32),
+        edges.data[nonzero],
+    )
+
+
+def project_levels(
+    graph: GraphArrays, memberships: Dict[str, pd.DataFrame], ids: IdDictionary
+) -> Dict[str, GraphArrays]:
+    """The projections of an author graph on every level of `memberships`."""
+    return {
+        level: project_graph(graph, level_memberships, ids, level)
+        for level, level_memberships in memberships.items()
+    }
+
+
+def country_matrix(graph: GraphArrays, countries: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    Symmetric collaboration matrix of a country graph over `countries` (by default
+    every country of mappings.COUNTRY_CODES), domestic collaborations on the diagonal.
+    """
+    countries = list(mappings.COUNTRY_CODES) if countries is None else list(countries)
+    index = pd.Index(countries).get_indexer(graph.nodes["id"])
+    src, dst = index[graph.src], index[graph.dst]
+    weight = np.asarray(graph.weight, dtype=np.float64)
+    known = (src >= 0) & (dst >= 0)
+    src, dst, weight = src[known], dst[known], weight[known]
+
+    matrix = np.zeros((len(countries), len(countries)))
+    np.add.at(matrix, (src, dst), weight)
+    np.add.at(matrix, (dst, src), np.where(src != dst, weight, 0))
+    return pd.DataFrame(matrix, index=countries, columns=countries)
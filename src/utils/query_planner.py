@@ -0,0 +1,149 @@
+"""
+Query planner for OpenAlex count cubes.
+
+A count cube asks for one or more metrics for every combination of countries, years
+and subfields. Asking OpenAlex once per cell costs |countries| x |years| x |subfields|
+requests. A single `group_by` request instead returns the counts of every value of one
+dimension, so the planner groups on the dimension that removes the most requests and
+only filters on the others. Metrics that `group_by` cannot return (e.g. the
+`cited_by_count_sum` citation total) fall back to one request per cell.
+"""
+
+import logging
+from itertools import product
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from utils.http_cache import CacheMissError
+from utils.openalex import OpenAlexClient
+
+# Filter and group_by field of every cube dimension
+DIMENSIONS = {
+    "country_code": "institutions.country_code",
+    "publication_year": "publication_year",
+    "subfield_id": "primary_topic.subfield.id",
+}
+
+# Metric name -> field of the response `meta` section holding it
+METRIC_FIELDS = {
+    "count": "count",
+    "citation_count": "cited_by_count_sum",
+}
+
+# Metrics that a group_by response reports per group
+GROUPABLE_METRICS = {"count"}
+
+
+class CountQuery(NamedTuple):
+    """
+    One planned request: `fixed` maps dimensions to the single value filtered on;
+    `group_dimension` is the dimension returned by group_by, or None for a per-cell query.
+    """
+
+    params: Dict
+    fixed: Dict[str, str]
+    group_dimension: Optional[str]
+
+
+def normalize_key(dimension: str, value) -> str:
+    """Normalizes a dimension value or group_by key to the form used in the cube."""
+    value = str(value).replace("https://openalex.org/", "")
+    if dimension == "country_code":
+        return value.replace("countries/", "").upper()
+    return value
+
+
+def plan_count_queries(
+    base_filter: str, cube: Dict[str, Sequence], metrics: Sequence[str]
+) -> List[CountQuery]:
+    """
+    Plans the fewest requests that answer `metrics` for every cell of `cube`.
+
+    Parameters:
+        base_filter: filter shared by every cell (e.g. type and field).
+        cube: maps each dimension in DIMENSIONS to the values requested for it.
+        metrics: names from METRIC_FIELDS.
+
+    Returns:
+        list[CountQuery]: per-cell queries if any metric is not groupable, otherwise
+        one group_by query per combination of the non-grouped dimensions.
+    """
+    unknown = set(metrics) - set(METRIC_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown metrics: {sorted(unknown)}")
+    dimensions = list(cube)
+
+    group_dimension = None
+    if set(metrics) <= GROUPABLE_METRICS:
+        # Grouping on the largest dimension leaves the fewest combinations to filter on
+        group_dimension = max(dimensions, key=lambda d: len(cube[d]))
+
+    fixed_dimensions = [d for d in dimensions if d != group_dimension]
+    queries = []
+    for values in product(*(cube[d] for d in fixed_dimensions)):
+        fixed = dict(zip(fixed_dimensions, (str(v) for v in values)))
+        filters = [base_filter] + [f"{DIMENSIONS[d]}:{v}" for d, v in fixed.items()]
+        params = {"filter": ",".join(filters), "per_page": 1, "select": "id"}
+
+        if group_dimension is None:
+            if "citation_count" in metrics:
+                params["cited_by_count_sum"] = "true"
+        else:
+            # Restrict the groups to the requested values
+            requested = "|".join(str(v) for v in cube[group_dimension])
+            params["filter"] += f",{DIMENSIONS[group_dimension]}:{requested}"
+            params["group_by"] = DIMENSIONS[group_dimension]
+            params.pop("select")
+        queries.append(CountQuery(params, fixed, group_dimension))
+    return queries
+
+
+def execute_count_queries(
+    queries: List[CountQuery],
+    cube: Dict[str, Sequence],
+    metrics: Sequence[str],
+    client: OpenAlexClient,
+    logger: logging.Logger,
+) -> List[Dict]:
+    """
+    Runs planned queries concurrently and expands the responses into one row per cell.
+    Cells missing from a group_by response have a count of 0. Failed requests are
+    logged and then raised, as a missing cell would read as 0: a CacheMissError (in
+    offline mode) as such, any other failure as a RuntimeError.
+    """
+    responses = client.get_many([query.params for query in queries])
+    errors = []
+    for query, data in zip(queries, responses):
+        if isinstance(data, Exception):
+            logger.error(f"Error fetching counts for {query.fixed}: {data}")
+            errors.append(data)
+    if errors:
+        misses = [error for error in errors if isinstance(error, CacheMissError)]
+        if misses:
+            raise CacheMissError(
+                f"{len(misses)} of {len(queries)} count queries are not cached"
+            ) from misses[0]
+        raise RuntimeError(f"{len(errors)} of {len(queries)} count queries failed") from errors[0]
+
+    rows = []
+    for query, data in zip(queries, responses):
+
+        if query.group_dimension is None:
+            meta = data.get("meta", {})
+            rows.append(
+                {
+                    **query.fixed,
+                    **{m: meta.get(METRIC_FIELDS[m], 0) or 0 for m in metrics},
+                }
+            )
+            continue
+
+        counts = {
+            normalize_key(query.group_dimension, group["key"]): group["count"]
+            for group in data.get("group_by", [])
+        }
+        for value in cube[query.group_dimension]:
+            key = normalize_key(query.group_dimension, value)
+            rows.append(
+                {**query.fixed, query.group_dimension: str(value), "count": counts.get(key, 0)}
+            )
+    return rows
@@ -0,0 +1,115 @@
+"""
+Ingestion of works from a local OpenAlex snapshot.
+
+The snapshot stores works as gzip-compressed JSON lines under
+`works/updated_date=*/part_*.gz`. Partitions are decompressed, filtered and flattened
+in parallel worker processes; each worker writes the rows it keeps into small staging
+CSVs per (country, year) slice, which the caller then merges into the slice files.
+"""
+
+import csv
+import glob
+import gzip
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from utils.works import process_work
+
+# Field of "Computer Science", as filtered by primary_topic.field.id:17 on the API
+FIELD_ID = "https://openalex.org/fields/17"
+WORK_TYPE = "article"
+
+
+def list_partitions(snapshot_dir: str) -> List[str]:
+    """Returns the works partition files of a snapshot, oldest update first."""
+    pattern = os.path.join(snapshot_dir, "works", "updated_date=*", "part_*.gz")
+    return sorted(glob.glob(pattern))
+
+
+def work_countries(work: Dict) -> Set[str]:
+    """Country codes of all institutions of a work, as matched by institutions.country_code."""
+    return {
+        institution.get("country_code")
+        for authorship in work.get("authorships") or []
+        for institution in authorship.get("institutions") or []
+        if institution.get("country_code")
+    }
+
+
+def match_slices(work: Dict, countries: Set[str], years: Set[int]) -> List[Tuple[str, int]]:
+    """
+    Returns the (country, year) slices whose API query would return the work: the same
+    type, field, publication year and institution country filters used by 3_0.
+    """
+    if work.get("type") != WORK_TYPE or work.get("publication_year") not in years:
+        return []
+    field = ((work.get("primary_topic") or {}).get("field") or {}).get("id")
+    if field != FIELD_ID:
+        return []
+    year = work["publication_year"]
+    return [(country, year) for country in sorted(work_countries(work) & countries)]
+
+
+def process_partition(
+    path: str, countries: Iterable[str], years: Iterable[int], staging_dir: str
+) -> Dict[Tuple[str, int], Tuple[str, int]]:
+    """
+    Filters and flattens one partition file.
+    Returns {(country, year): (staging CSV path, rows)} for the slices it contributed to.
+    """
+    countries = set(countries)
+    years = {int(year) for year in years}
+    partition = os.path.relpath(path, os.path.dirname(os.path.dirname(path)))
+    prefix = partition.replace(os.sep, "_").replace("=", "-").removesuffix(".gz")
+
+    files, writers, counts = {}, {}, {}
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                work = json.loads(line)
+                slices = match_slices(work, countries, years)
+                if not slices:
+                    continue
+                row = process_work(work)
+                for key in slices:
+                    if key not in writers:
+                        staging_file = os.path.join(staging_dir, f"{prefix}_{key[0]}_{key[1]}.csv")
+                        files[key] = open(staging_file, "w", newline="")
+                        writers[key] = csv.DictWriter(files[key], fieldnames=list(row))
+                        writers[key].writeheader()
+                        counts[key] = 0
+                    writers[key].writerow(row)
+                    counts[key] += 1
+    finally:
+        for file in files.values():
+            file.close()
+
+    return {key: (files[key].name, counts[key]) for key in files}
+
+
+def ingest_partitions(
+    partitions: List[str],
+    countries: Iterable[str],
+    years: Iterable[int],
+    staging_dir: str,
+    max_workers: Optional[int] = None,
+) -> Dict[Tuple[str, int], List[str]]:
+    """
+    Processes partitions in a process pool.
+    Returns the staging CSVs of every (country, year) slice, in partition order.
+    """
+    os.makedirs(staging_dir, exist_ok=True)
+    worker = partial(
+        process_partition, countries=list(countries), years=list(years), staging_dir=staging_dir
+    )
+    staged = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for result in executor.map(worker, partitions):
+            for key, (staging_file, _) in result.items():
+                staged.setdefault(key, []).append(staging_file)
+    return staged
@@ -0,0 +1,194 @@
+"""
+Sparse-matrix engine for the co-authorship networks.
+
+Drop-in alternative to `collabnet.build_collaboration_network`: instead of counting
+`combinations(authors, 2)` in a dict, the authorships become a sparse works x authors
+incidence matrix B (B[w, a] = number of authorships of author a on work w) and the
+co-authorship weights are the off-diagonal entries of the sparse product BᵀB. The
+diagonal only matters for authors listed twice on a work, whose self-pairs
+combinations() also counts: they are kept as self-loops, as the dict builder does.
+
+Node attributes are array reductions over the same authorships: publications are the
+column sums of B, the subfield counts are BᵀS for the works x subfields indicator S,
+and first authorships come from one lexsort of the authorships in input order.
+
+A TeamPolicy (utils.large_teams) scales the rows of B: fractional weighting computes
+BᵀWB with W the diagonal of 1/(k-1), and large teams are left out of the product and,
+as stars, added as explicit pairs of their first author.
+
+The graph has the same nodes (in the same order), attributes, edges and weights as the
+dict builder's; only the order of the edges differs.
+"""
+
+from typing import Optional
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from utils.author_profiles import UNKNOWN
+from utils.graph_store import GraphArrays
+from utils.id_dictionary import MISSING, IdDictionary
+from utils.large_teams import LargeTeamReport, TeamPolicy, is_large, pair_weight
+
+
+def incidence_matrix(work_index: np.ndarray, author_index: np.ndarray, shape) -> sp.csr_matrix:
+    """Sparse works x authors matrix counting the authorships of every pair."""
+    data = np.ones(len(work_index), dtype=np.int64)
+    # Repeated (work, author) entries are summed when converting to CSR
+    return sp.coo_matrix((data, (work_index, author_index)), shape=shape).tocsr()
+
+
+def collaboration_graph_arrays(
+    works: pd.DataFrame,
+    authorships: pd.DataFrame,
+    ids: IdDictionary,
+    with_publication_count: bool = False,
+    profiles: Optional[pd.DataFrame] = None,
+    policy: TeamPolicy = TeamPolicy(),
+    report: Optional[LargeTeamReport] = None,
+) -> GraphArrays:
+    """
+    The graph of `collabnet.build_collaboration_network`, with the same arguments, as
+    GraphArrays (utils.graph_store) without going through networkx.
+    """
+    policy.check()
+    if "work_index" in works:
+        works = works.sort_values("work_index")
+    work_rows = pd.DataFrame(
+        {"work_code": works["work_code"].to_numpy(), "work_row": np.arange(len(works))}
+    )
+    authorships = authorships[authorships["author_code"] != MISSING].merge(
+        work_rows, on="work_code"
+    )
+
+    # Authorships in input order: work order, then position within the work
+    order = np.lexsort((authorships["position"].to_numpy(), authorships["work_row"].to_numpy()))
+    authorships = authorships.iloc[order]
+    work_row = authorships["work_row"].to_numpy()
+    author_codes = authorships["author_code"].to_numpy()
+
+    # Authors are numbered in order of first authorship, the node order of the builders
+    codes, first, inverse = np.unique(author_codes, return_index=True, return_inverse=True)
+    by_first = np.argsort(first, kind="stable")
+    codes, first = codes[by_first], first[by_first]
+    rank = np.empty(len(codes), dtype=np.int64)
+    rank[by_first] = np.arange(len(codes))
+    author = rank[inverse]
+
+    B = incidence_matrix(work_row, author, (len(works), len(codes)))
+    team_size = np.asarray(B.sum(axis=1)).ravel()
+    if report is not None:
+        report.add(team_size)
+    large = is_large(team_size, policy)
+    # Pair weight of every work, 0 for the large teams left out of the product
+    work_weight = np.where(large, 0, pair_weight(team_size, policy))
+    W = sp.diags(work_weight, dtype=work_weight.dtype)
+    WB = W @ B
+    A = (B.T @ WB).tocoo()
+
+    # Upper triangle: each undirected edge once; the diagonal holds the self-pairs of
+    # authors listed m times on a work, m * m of them where combinations() has m(m-1)/2
+    upper = A.row < A.col
+    diagonal = A.row == A.col
+    self_pairs = (A.data[diagonal] - np.asarray(WB.sum(axis=0)).ravel()[A.row[diagonal]]) / 2
+    src = [A.row[upper], A.row[diagonal]]
+    dst = [A.col[upper], A.col[diagonal]]
+    weight = [A.data[upper], self_pairs]
+
+    if policy.large_teams == "star" and large.any():
+        # Each large team as the pairs of its first author with the other authorships
+        starts = np.flatnonzero(np.r_[True, work_row[1:] != work_row[:-1]])
+        center = np.repeat(author[starts], np.diff(np.r_[starts, len(work_row)]))
+        star = large[work_row]
+        star[starts] = False
+        src.append(np.minimum(center[star], author[star]))
+        dst.append(np.maximum(center[star], author[star]))
+        weight.append(pair_weight(team_size, policy)[work_row[star]])
+
+    edges = sp.coo_matrix(
+        (np.concatenate(weight), (np.concatenate(src), np.concatenate(dst))),
+        shape=(len(codes), len(codes)),
+    ).tocsr().tocoo()
+    nonzero = edges.data != 0
+    src, dst, weight = edges.row[nonzero], edges.col[nonzero], edges.data[nonzero]
+    if policy.weighting == "count":
+        weight = np.rint(weight).astype(np.int64)
+
+    if profiles is not None:
+        profiles = profiles.reindex(codes)
+        country = profiles["primary_country"].to_numpy()
+        subfield = profiles["primary_subfield"].to_numpy()
+        publications = profiles["publications"].to_numpy()
+    else:
+        country = authorships["country"].fillna(UNKNOWN).to_numpy()[first]
+        publications = np.asarray(B.sum(axis=0)).ravel()
+        subfield = primary_subfields(works, B)
+
+    nodes = pd.DataFrame(
+        {"id": ids.decode("authors", codes), "label1": country, "label2": subfield}
+    )
+    if with_publication_count:
+        nodes["label3"] = publications.astype(np.int64)
+    return GraphArrays(nodes, src.astype(np.int32), dst.astype(np.int32), weight)
+
+
+def primary_subfields(works: pd.DataFrame, B: sp.csr_matrix) -> np.ndarray:
+    """
+    Subfield with most publications of every author (column of B), ties going to the
+    subfield the author published in first, as in the dict builders.
+    """
+    names, subfield = np.unique(
+        works["subfield_name"].fillna(UNKNOWN).to_numpy(dtype=object), return_inverse=True
+    )
+    S = sp.csr_matrix(
+        (np.ones(len(works), dtype=np.int64), (np.arange(len(works)), subfield)),
+        shape=(len(works), len(names)),
+    )
+    counts = (B.T @ S).tocoo()
+    primary = np.empty(B.shape[1], dtype=object)
+    if counts.nnz == 0:
+        return primary
+
+    # First work of every (author, subfield): the lowest work row of B's column among
+    # the works of that subfield
+    Bc = B.tocsc()
+    work_rows = Bc.indices
+    authors = np.repeat(np.arange(B.shape[1]), np.diff(Bc.indptr))
+    pair = authors * len(names) + subfield[work_rows]
+    order = np.argsort(pair, kind="stable")
+    pair, work_rows = pair[order], work_rows[order]
+    starts = np.flatnonzero(np.r_[True, pair[1:] != pair[:-1]])
+    first_row = np.minimum.reduceat(work_rows, starts)
+    first_seen = first_row[np.searchsorted(pair[starts], counts.row * len(names) + counts.col)]
+
+    # Per author: highest count first, then earliest subfield
+    order = np.lexsort((first_seen, -counts.data, counts.row))
+    best = order[np.r_[True, counts.row[order][1:] != counts.row[order][:-1]]]
+    primary[counts.row[best]] = names[counts.col[best]]
+    return primary
+
+
+def build_collaboration_network(
+    works: pd.DataFrame,
+    authorships: pd.DataFrame,
+    ids: IdDictionary,
+    with_publication_count: bool = False,
+    profiles: Optional[pd.DataFrame] = None,
+    policy: TeamPolicy = TeamPolicy(),
+    report: Optional[LargeTeamReport] = None,
+) -> nx.Graph:
+    """Sparse-matrix version of collabnet.build_collaboration_network (same arguments)."""
+    graph = collaboration_graph_arrays(
+        works, authorships, ids, with_publication_count, profiles, policy, report
+    )
+    G = nx.Graph()
+    G.add_nodes_from(
+        (record.pop("id"), record) for record in graph.nodes.to_dict("records")
+    )
+    node_ids = graph.nodes["id"].to_numpy()
+    G.add_weighted_edges_from(
+        zip(node_ids[graph.src].tolist(), node_ids[graph.dst].tolist(), graph.weight.tolist())
+    )
+    return G
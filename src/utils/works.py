@@ -0,0 +1,113 @@
+"""
+Flattening of OpenAlex work records into the rows of the publication metadata CSVs.
+Shared by the API harvest and the snapshot ingestion of 3_0_collect_publication_meta.
+"""
+
+import json
+from typing import Dict
+
+# Columns of the rows returned by process_work, in order
+WORK_COLUMNS = [
+    "id",
+    "doi",
+    "title",
+    "publication_year",
+    "authorships",
+    "subfield",
+    "cited_by_count",
+    "counts_by_year",
+    "primary_topic",
+]
+
+
+def process_doi(doi: str) -> str:
+    """
+    Removes the 'https://doi.org/' prefix from a DOI string.
+    """
+    if doi and doi.startswith("https://doi.org/"):
+        return doi.replace("https://doi.org/", "")
+    return doi
+
+
+def process_openalex_id(openalex_id: str) -> str:
+    """
+    Removes the 'https://openalex.org/' prefix from an OpenAlex ID string.
+    """
+    if openalex_id and openalex_id.startswith("https://openalex.org/"):
+        return openalex_id.replace("https://openalex.org/", "")
+    return openalex_id
+
+
+def process_work(work: Dict) -> Dict:
+    """
+    Processes a single work to extract and flatten required fields,
+    while removing DOI and OpenAlex URL prefixes.
+    
+    For the counts_by_year field, instead of keeping the original years,
+    the citations are saved with keys representing the offset relative to the publication year.
+    For example, if a work was published in 2020:
+      - The number of citations in 2020 will be stored as "0_year"
+      - The number of citations in 2021 will be stored as "1_year", etc.
+    """
+    processed = {
+        "id": process_openalex_id(work.get("id")),
+        "doi": process_doi(work.get("doi")),
+        "title": work.get("title"),
+        "publication_year": work.get("publication_year"),
+        "authorships": [],
+        "subfield": {},
+        "cited_by_count": work.get("cited_by_count"),
+        "counts_by_year": ""  # will update below
+    }
+
+    # Process authorships
+    authorships = work.get("authorships", [])
+    for authorship in authorships:
+        author_info = authorship.get("author", {})
+        institutions = [
+            {
+                "id": process_openalex_id(inst.get("id")),
+                "display_name": inst.get("display_name"),
+            }
+            for inst in authorship.get("institutions", [])
+        ]
+        processed_author = {
+            "id": process_openalex_id(author_info.get("id")),
+            "name": author_info.get("display_name"),
+            "institutions": institutions,
+            "countries": authorship.get("countries", []),
+        }
+        processed["authorships"].append(processed_author)
+
+    # Process primary topic and subfield
+    primary_topic = work.get("primary_topic", {})
+    processed_topic = {
+        "id": process_openalex_id(primary_topic.get("id")),
+        "display_name": primary_topic.get("display_name"),
+    }
+    processed["primary_topic"] = processed_topic
+
+    subfield = primary_topic.get("subfield", {})
+    processed["subfield"] = {
+        "id": process_openalex_id(subfield.get("id")),
+        "display_name": subfield.get("display_name"),
+    }
+
+    # Process counts_by_year: shift years relative to the publication year
+    publication_year = work.get("publication_year")
+    counts_by_year_data = work.get("counts_by_year", [])
+    offset_citations = {}
+    if counts_by_year_data and publication_year:
+        for item in counts_by_year_data:
+            # Compute offset: citation year minus publication year
+            offset = item["year"] - publication_year
+            if offset >= 0:
+                key = f"{offset}_year"
+                offset_citations[key] = item["cited_by_count"]
+            # If offset is negative, skip the entry as it is likely a data error.
+    processed["counts_by_year"] = json.dumps(offset_citations)
+
+    # Convert complex fields to JSON strings
+    processed["authorships"] = json.dumps(processed["authorships"])
+    processed["subfield"] = json.dumps(processed["subfield"])
+    return processed
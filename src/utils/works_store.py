@@ -0,0 +1,335 @@
+"""
+Normalized columnar store of publication metadata.
+
+The publication metadata CSVs keep `authorships`, `subfield` and `counts_by_year` as
+JSON strings, so every reader has to parse them again row by row. The store parses
+them once and keeps the works as Parquet tables in one directory:
+
+    works                 one row per work (work_code, work_index, doi, title,
+                          publication_year, subfield_code, subfield_name, cited_by_count),
+                          where work_index is the position of the work in the input
+    authorships           one row per authorship (work_code, position, author_code,
+                          institution_code, country), with the author's first institution
+                          and country
+    authorship_countries  one row per country of an authorship (work_code, position, country)
+    citations_by_offset   one row per citing year (work_code, offset, cited_by_count), with
+                          the offset counted from the publication year
+
+Work, author, institution and subfield IDs are stored as int32 codes of the store's
+IdDictionary (utils.id_dictionary, saved under `<store>/ids`), MISSING for absent IDs.
+The dictionary is carried over when the store is rebuilt, so codes stay stable.
+
+Every table is partitioned by the (subfield_id, publication_year) of its works, as
+`<store>/<subfield>/<year>/<table>.parquet`, and `index.json` lists the partitions with
+their subfield name and row counts. Readers load only the partitions, tables and
+columns they need, and filter them with pandas or Parquet predicates instead of parsing
+JSON. The CSVs stay the export format.
+"""
+
+import json
+import os
+import shutil
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.id_dictionary import IdDictionary
+
+SCHEMAS = {
+    "works": pa.schema(
+        [
+            ("work_code", pa.int32()),
+            ("work_index", pa.int64()),
+            ("doi", pa.string()),
+            ("title", pa.string()),
+            ("publication_year", pa.int32()),
+            ("subfield_code", pa.int32()),
+            ("subfield_name", pa.string()),
+            ("cited_by_count", pa.int64()),
+        ]
+    ),
+    "authorships": pa.schema(
+        [
+            ("work_code", pa.int32()),
+            ("position", pa.int32()),
+            ("author_code", pa.int32()),
+            ("institution_code", pa.int32()),
+            ("country", pa.string()),
+        ]
+    ),
+    "authorship_countries": pa.schema(
+        [
+            ("work_code", pa.int32()),
+            ("position", pa.int32()),
+            ("country", pa.string()),
+        ]
+    ),
+    "citations_by_offset": pa.schema(
+        [
+            ("work_code", pa.int32()),
+            ("offset", pa.int32()),
+            ("cited_by_count", pa.int64()),
+        ]
+    ),
+}
+
+INDEX_FILE = "index.json"
+IDS_DIR = "ids"
+# Partition directory of works without a subfield or publication year
+UNKNOWN_PARTITION = "unknown"
+
+
+def partition_dir(subfield_id: Optional[str], year: Optional[int]) -> str:
+    """Relative directory of a partition, e.g. "1702/2019" for subfields/1702."""
+    subfield = subfield_id.rsplit("/", 1)[-1] if isinstance(subfield_id, str) else None
+    year = None if pd.isna(year) else str(int(year))
+    return os.path.join(subfield or UNKNOWN_PARTITION, year or UNKNOWN_PARTITION)
+
+
+def table_path(store_dir: str, partition: str, table: str) -> str:
+    return os.path.join(store_dir, partition, f"{table}.parquet")
+
+
+def store_exists(store_dir: str) -> bool:
+    """True once a store has been completely written (the index is written last)."""
+    return os.path.exists(os.path.join(store_dir, INDEX_FILE))
+
+
+def read_ids(store_dir: str) -> IdDictionary:
+    """Loads the ID dictionary of a store, to decode its codes."""
+    return IdDictionary.load(os.path.join(store_dir, IDS_DIR))
+
+
+def read_index(store_dir: str) -> pd.DataFrame:
+    """
+    Returns one row per partition: path, subfield_id, subfield_name, publication_year
+    and the number of rows of every table.
+    """
+    with open(os.path.join(store_dir, INDEX_FILE), "r") as f:
+        partitions = json.load(f)["partitions"]
+    return pd.DataFrame(
+        [{**{k: v for k, v in p.items() if k != "rows"}, **p["rows"]} for p in partitions],
+        columns=["path", "subfield_id", "subfield_name", "publication_year", *SCHEMAS],
+    )
+
+
+def select_partitions(
+    index: pd.DataFrame,
+    subfields: Optional[Sequence[str]] = None,
+    years: Optional[Sequence[int]] = None,
+) -> pd.DataFrame:
+    """Index rows of the partitions of the given subfield names and years (None: all)."""
+    mask = pd.Series(True, index=index.index)
+    if subfields is not None:
+        mask &= index["subfield_name"].isin(list(subfields))
+    if years is not None:
+        mask &= index["publication_year"].isin([int(year) for year in years])
+    return index[mask]
+
+
+def _parse_json(value, default):
+    if not isinstance(value, str):
+        return default
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return default
+
+
+def _optional(value):
+    """Missing CSV values (NaN) as None, so that they are stored as nulls."""
+    return None if pd.isna(value) else value
+
+
+def normalize_works(
+    df: pd.DataFrame, ids: IdDictionary, start: int = 0
+) -> Dict[str, pd.DataFrame]:
+    """
+    Splits publication metadata rows, as written by 3_0, into the store tables, numbering
+    the works from `start` and interning their IDs in `ids`. Works whose authorships
+    cannot be parsed keep their works row but have no authors.
+    """
+    works, authorships, authorship_countries, citations = [], [], [], []
+    columns = zip(
+        df["id"],
+        df["doi"],
+        df["title"],
+        df["publication_year"],
+        df["subfield"],
+        df["cited_by_count"],
+        df["authorships"],
+        df["counts_by_year"],
+    )
+    for work_index, (work_id, doi, title, year, subfield, cited_by_count, authors, counts) in (
+        enumerate(columns, start)
+    ):
+        subfield = _parse_json(subfield, {}) or {}
+        works.append(
+            (
+                work_id,
+                work_index,
+                _optional(doi),
+                _optional(title),
+                _optional(year),
+                subfield.get("id"),
+                subfield.get("display_name"),
+                _optional(cited_by_count),
+            )
+        )
+
+        for position, author in enumerate(_parse_json(authors, []) or []):
+            institutions = author.get("institutions") or []
+            countries = author.get("countries") or []
+            authorships.append(
+                (
+                    work_id,
+                    position,
+                    author.get("id"),
+                    institutions[0].get("id") if institutions else None,
+                    countries[0] if countries else None,
+                )
+            )
+            authorship_countries.extend((work_id, position, country) for country in countries)
+
+        for key, count in (_parse_json(counts, {}) or {}).items():
+            # Keys are "<offset>_year", see utils.works.process_work
+            citations.append((work_id, int(key.split("_")[0]), count))
+
+    rows = {
+        "works": works,
+        "authorships": authorships,
+        "authorship_countries": authorship_countries,
+        "citations_by_offset": citations,
+    }
+    tables = {
+        table: pd.DataFrame(rows[table], columns=SCHEMAS[table].names) for table in SCHEMAS
+    }
+
+    # The ID columns were filled with IDs above and are replaced by their codes
+    for table, table_df in tables.items():
+        table_df["work_code"] = ids.encode("works", table_df["work_code"])
+    tables["works"]["subfield_code"] = ids.encode("subfields", tables["works"]["subfield_code"])
+    tables["authorships"]["author_code"] = ids.encode(
+        "authors", tables["authorships"]["author_code"]
+    )
+    tables["authorships"]["institution_code"] = ids.encode(
+        "institutions", tables["authorships"]["institution_code"]
+    )
+    return tables
+
+
+def write_works_store(frames: Iterable[pd.DataFrame], store_dir: str) -> Dict[str, int]:
+    """
+    Normalizes publication metadata frames and writes them as the partitioned tables of
+    a store, one Parquet row group per frame and partition, so the input can be streamed
+    in chunks. The store is built next to `store_dir` and swapped in once complete.
+
+    Returns:
+        dict: number of rows written per table.
+    """
+    tmp_dir = f"{store_dir.rstrip(os.sep)}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    ids = read_ids(store_dir)
+
+    writers = {}
+    partitions = {}
+    rows = dict.fromkeys(SCHEMAS, 0)
+    try:
+        for df in frames:
+            tables = normalize_works(df, ids, start=rows["works"])
+            works = tables["works"]
+            subfield_ids = ids.decode("subfields", works["subfield_code"])
+            work_partitions = [
+                partition_dir(subfield_id, year)
+                for subfield_id, year in zip(subfield_ids, works["publication_year"])
+            ]
+            for subfield_id, subfield_name, year, partition in zip(
+                subfield_ids,
+                works["subfield_name"],
+                works["publication_year"],
+                work_partitions,
+            ):
+                if partition not in partitions:
+                    partitions[partition] = {
+                        "path": partition,
+                        "subfield_id": subfield_id,
+                        "subfield_name": subfield_name,
+                        "publication_year": None if pd.isna(year) else int(year),
+                        "rows": dict.fromkeys(SCHEMAS, 0),
+                    }
+
+            # Every row of every table goes to the partition of its work
+            work_partition = dict(zip(works["work_code"], work_partitions))
+            for table, table_df in tables.items():
+                keys = table_df["work_code"].map(work_partition)
+                for partition, part_df in table_df.groupby(keys, sort=False):
+                    if (partition, table) not in writers:
+                        os.makedirs(os.path.join(tmp_dir, partition), exist_ok=True)
+                        writers[partition, table] = pq.ParquetWriter(
+                            table_path(tmp_dir, partition, table), SCHEMAS[table]
+                        )
+                    writers[partition, table].write_table(
+                        pa.Table.from_pandas(
+                            part_df, schema=SCHEMAS[table], preserve_index=False
+                        )
+                    )
+                    partitions[partition]["rows"][table] += len(part_df)
+                rows[table] += len(table_df)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    # Tables without rows in a partition are written empty, so every partition is complete
+    for partition in partitions:
+        for table, schema in SCHEMAS.items():
+            if (partition, table) not in writers:
+                pq.write_table(schema.empty_table(), table_path(tmp_dir, partition, table))
+
+    ids.save(os.path.join(tmp_dir, IDS_DIR))
+    index = {"partitions": [partitions[p] for p in sorted(partitions)]}
+    with open(os.path.join(tmp_dir, INDEX_FILE), "w") as f:
+        json.dump(index, f, indent=2)
+
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.replace(tmp_dir, store_dir)
+    return rows
+
+
+def read_partition(
+    store_dir: str, path: str, table: str, columns: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """Loads a table of one partition, by its index path, e.g. to stream a store."""
+    if table not in SCHEMAS:
+        raise ValueError(f"Unknown table: {table}")
+    return pq.read_table(table_path(store_dir, path, table), columns=columns).to_pandas()
+
+
+def read_table(
+    store_dir: str,
+    table: str,
+    columns: Optional[List[str]] = None,
+    filters: Optional[List] = None,
+    subfields: Optional[Sequence[str]] = None,
+    years: Optional[Sequence[int]] = None,
+) -> pd.DataFrame:
+    """
+    Loads a store table from the partitions of the given subfield names and years only,
+    projected on `columns` and filtered with Parquet predicates,
+    e.g. filters=[("cited_by_count", ">", 100)].
+    """
+    if table not in SCHEMAS:
+        raise ValueError(f"Unknown table: {table}")
+    partitions = select_partitions(read_index(store_dir), subfields, years)
+    frames = [
+        pq.read_table(
+            table_path(store_dir, partition, table), columns=columns, filters=filters
+        ).to_pandas()
+        for partition in partitions["path"]
+    ]
+    if not frames:
+        schema = SCHEMAS[table]
+        return schema.empty_table().select(columns or schema.names).to_pandas()
+    return pd.concat(frames, ignore_index=True)